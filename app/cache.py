@@ -0,0 +1,103 @@
+import json
+from collections import OrderedDict
+from typing import Optional
+
+from .config import CACHE_ENABLED, CACHE_LRU_SIZE, CACHE_REDIS_URL, CACHE_TTL
+from .metrics import CACHE_REQUESTS
+
+# Bumped by the ETL after every committed load; part of every cache key
+GENERATION_KEY = "temperatures:cache:generation"
+KEY_PREFIX = "temperatures:cache"
+
+
+def bump_generation() -> Optional[int]:
+    """Invalidate every cached response (called by the worker after a load commits)"""
+    if not CACHE_REDIS_URL:
+        return None
+    import redis
+
+    client = redis.Redis.from_url(CACHE_REDIS_URL)
+    try:
+        return client.incr(GENERATION_KEY)
+    finally:
+        client.close()
+
+
+class ResponseCache:
+    """Two-tier cache of serialized responses: in-process LRU, then Redis.
+
+    Keys are prefixed with the current generation read from Redis, so a load
+    committed by any worker makes every older entry unreachable at once.
+    Without Redis the cache is disabled, since the API would have no way to
+    learn about new loads.
+    """
+
+    def __init__(self, redis_url: str = CACHE_REDIS_URL, max_size: int = CACHE_LRU_SIZE, ttl: int = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._redis = None
+        if CACHE_ENABLED and redis_url:
+            import redis.asyncio
+
+            self._redis = redis.asyncio.Redis.from_url(redis_url)
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    async def generation(self) -> Optional[int]:
+        """Current generation, or None when Redis is unavailable"""
+        if self._redis is None:
+            return None
+        try:
+            value = await self._redis.get(GENERATION_KEY)
+        except Exception as e:
+            print(f"Response cache unavailable: {str(e)}")
+            return None
+        return int(value or 0)
+
+    def key(self, generation: int, *parts) -> str:
+        """Cache key for parts, JSON-encoded so that None and the string 'None' differ"""
+        return f"{KEY_PREFIX}:{generation}:" + json.dumps(parts, separators=(",", ":"))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self._lru.get(key)
+        if value is not None:
+            self._lru.move_to_end(key)
+            self.hits += 1
+            CACHE_REQUESTS.labels('lru_hit').inc()
+            return value
+
+        try:
+            value = await self._redis.get(key)
+        except Exception:
+            value = None
+        if value is None:
+            self.misses += 1
+            CACHE_REQUESTS.labels('miss').inc()
+            return None
+
+        self._remember(key, value)
+        self.hits += 1
+        CACHE_REQUESTS.labels('redis_hit').inc()
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        self._remember(key, value)
+        try:
+            await self._redis.set(key, value, ex=self.ttl)
+        except Exception:
+            pass
+
+    def _remember(self, key: str, value: bytes) -> None:
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.close()
@@ -4,3 +4,99 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
+
+# ETL settings
+ETL_STREAMING = os.getenv("ETL_STREAMING", "true").lower() == "true"
+ETL_CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE", "500000"))
+ETL_ENGINE = os.getenv("ETL_ENGINE", "pandas")  # pandas | pyarrow | polars
+ETL_LOAD_METHOD = os.getenv("ETL_LOAD_METHOD", "copy")  # copy | insert | orm | swap (replace year partitions)
+ETL_LOAD_BATCH_SIZE = int(os.getenv("ETL_LOAD_BATCH_SIZE", "5000"))
+ETL_PARTITIONS = int(os.getenv("ETL_PARTITIONS", "1"))  # >1 fans a large file out across workers
+ETL_PARTITION_MIN_BYTES = int(os.getenv("ETL_PARTITION_MIN_BYTES", str(64 * 1024 * 1024)))
+ETL_STAGE_PARQUET = os.getenv("ETL_STAGE_PARQUET", "false").lower() == "true"
+# Runs of one ingest before it is failed; with acks_late a file that kills its worker is redelivered
+ETL_MAX_ATTEMPTS = int(os.getenv("ETL_MAX_ATTEMPTS", "3"))
+
+# Range partitioning of citytemperature by year (PostgreSQL; applied when init_db creates the table)
+TEMPERATURE_PARTITIONING = os.getenv("TEMPERATURE_PARTITIONING", "false").lower() == "true"
+TEMPERATURE_PARTITION_YEARS = int(os.getenv("TEMPERATURE_PARTITION_YEARS", "10"))
+TEMPERATURE_PARTITION_FIRST_YEAR = int(os.getenv("TEMPERATURE_PARTITION_FIRST_YEAR", "1900"))
+
+# Beat task running VACUUM (ANALYZE) after large ingests, or VACUUM FULL on year
+# partitions past MAINTENANCE_COMPACT_RATIO dead/live
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "900"))
+MAINTENANCE_MIN_ROWS = int(os.getenv("MAINTENANCE_MIN_ROWS", "50000"))
+MAINTENANCE_COMPACT_RATIO = float(os.getenv("MAINTENANCE_COMPACT_RATIO", "0.5"))
+
+# Data directory watcher (runs in the worker; falls back to a periodic scan when disabled)
+WATCHER_ENABLED = os.getenv("WATCHER_ENABLED", "true").lower() == "true"
+# Without the watcher, a worker queues one directory scan when it becomes ready
+STARTUP_SCAN = os.getenv("STARTUP_SCAN", "true").lower() == "true"
+WATCH_MODE = os.getenv("WATCH_MODE", "auto")  # auto | inotify | polling
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "5"))
+WATCH_SETTLE_SECONDS = float(os.getenv("WATCH_SETTLE_SECONDS", "2"))
+
+# API settings
+TEMPERATURES_PAGE_SIZE = int(os.getenv("TEMPERATURES_PAGE_SIZE", "20"))
+TEMPERATURES_MAX_PAGE_SIZE = int(os.getenv("TEMPERATURES_MAX_PAGE_SIZE", "1000"))
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "30"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_CHECKSUM = os.getenv("UPLOAD_CHECKSUM", "true").lower() == "true"
+ETL_STATUS_BATCH_LIMIT = int(os.getenv("ETL_STATUS_BATCH_LIMIT", "200"))
+ETL_STATUS_STREAM_INTERVAL = float(os.getenv("ETL_STATUS_STREAM_INTERVAL", "1"))
+# Unknown task ids stay PENDING forever, so a status stream ends after this long regardless
+ETL_STATUS_STREAM_MAX_SECONDS = float(os.getenv("ETL_STATUS_STREAM_MAX_SECONDS", "3600"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+TEMPERATURES_BATCH_MAX_CITIES = int(os.getenv("TEMPERATURES_BATCH_MAX_CITIES", "200"))
+
+# Database pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Behind PgBouncer (transaction pooling): no client-side pool, no server-side prepared statements
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# Worker settings: each prefork child holds at most WORKER_DB_POOL_SIZE + WORKER_DB_MAX_OVERFLOW connections
+WORKER_DB_POOL_SIZE = int(os.getenv("WORKER_DB_POOL_SIZE", "1"))
+WORKER_DB_MAX_OVERFLOW = int(os.getenv("WORKER_DB_MAX_OVERFLOW", "1"))
+CELERY_PREFETCH_MULTIPLIER = int(os.getenv("CELERY_PREFETCH_MULTIPLIER", "1"))
+CELERY_ACKS_LATE = os.getenv("CELERY_ACKS_LATE", "true").lower() == "true"
+CELERY_MAX_TASKS_PER_CHILD = int(os.getenv("CELERY_MAX_TASKS_PER_CHILD", "0")) or None
+# Must exceed the longest ETL task, or Redis redelivers acks_late tasks still running
+CELERY_VISIBILITY_TIMEOUT = int(os.getenv("CELERY_VISIBILITY_TIMEOUT", str(4 * 3600)))
+
+# Queues: small and large ingests and housekeeping are consumed separately
+CELERY_INGEST_QUEUE = os.getenv("CELERY_INGEST_QUEUE", "ingest")
+CELERY_LARGE_INGEST_QUEUE = os.getenv("CELERY_LARGE_INGEST_QUEUE", "ingest_large")
+# Partition sub-tasks of a fanned-out ingest; consume it from every ingest worker
+CELERY_PARTITION_QUEUE = os.getenv("CELERY_PARTITION_QUEUE", "ingest_partitions")
+CELERY_MAINTENANCE_QUEUE = os.getenv("CELERY_MAINTENANCE_QUEUE", "maintenance")
+INGEST_LARGE_FILE_BYTES = int(os.getenv("INGEST_LARGE_FILE_BYTES", str(256 * 1024 * 1024)))
+# /datasets answers 429 once this many ingests are waiting in the broker (0 disables the check)
+INGEST_QUEUE_LIMIT = int(os.getenv("INGEST_QUEUE_LIMIT", "50"))
+INGEST_RETRY_AFTER = int(os.getenv("INGEST_RETRY_AFTER", "60"))
+
+# Response cache settings (Redis tier and generation counter; defaults to the broker
+# when that is Redis, otherwise the cache stays off unless CACHE_REDIS_URL is set)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+_BROKER_IS_REDIS = (CELERY_BROKER_URL or "").startswith(("redis://", "rediss://", "unix://"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", CELERY_BROKER_URL if _BROKER_IS_REDIS else "")
+CACHE_LRU_SIZE = int(os.getenv("CACHE_LRU_SIZE", "1024"))
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+
+# Upload service -> API client settings
+API_BASE_URL = os.getenv("API_BASE_URL", "http://fastapi_app:8000")
+UPSTREAM_POOL_LIMIT = int(os.getenv("UPSTREAM_POOL_LIMIT", "100"))
+UPSTREAM_KEEPALIVE_TIMEOUT = float(os.getenv("UPSTREAM_KEEPALIVE_TIMEOUT", "30"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "300"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.2"))
+
+# Metrics and profiling
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+ETL_PROFILE = os.getenv("ETL_PROFILE", "")  # "" | cprofile | pyinstrument
+ETL_PROFILE_TASKS = os.getenv("ETL_PROFILE_TASKS", "process_temperature_data").split(",")
+ETL_PROFILE_DIR = os.getenv("ETL_PROFILE_DIR", "/tmp/etl-profiles")
@@ -0,0 +1,77 @@
+"""Engine factories shared by the API (async) and the Celery worker (sync).
+
+Nothing is connected at import time: each process builds the engine it
+needs, and prefork children build their own after fork().
+"""
+import uuid
+
+from sqlalchemy.pool import NullPool
+
+from .config import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_PGBOUNCER,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    WORKER_DB_MAX_OVERFLOW,
+    WORKER_DB_POOL_SIZE,
+)
+
+# Show up in pg_stat_activity, so connections can be attributed per service
+API_APPLICATION_NAME = "temperature-api"
+WORKER_APPLICATION_NAME = "temperature-worker"
+
+# Convert async URL to sync URL for SQLModel
+SYNC_DATABASE_URL = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://").replace(
+    "sqlite+aiosqlite://", "sqlite://"
+)
+
+
+def _pool_args(pool_size: int, max_overflow: int) -> dict:
+    """Pool settings; behind PgBouncer (transaction pooling) the client keeps no pool at all"""
+    if DB_PGBOUNCER:
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def create_api_engine():
+    """Async engine for the API (DATABASE_URL uses the asyncpg driver)"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    connect_args = {}
+    if DATABASE_URL.startswith("postgresql"):
+        connect_args["server_settings"] = {"application_name": API_APPLICATION_NAME}
+        if DB_PGBOUNCER:
+            # asyncpg must not reuse named prepared statements across pooled server connections
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+
+    return create_async_engine(
+        DATABASE_URL, connect_args=connect_args, **_pool_args(DB_POOL_SIZE, DB_MAX_OVERFLOW)
+    )
+
+
+def create_worker_engine():
+    """Sync engine for the current worker process.
+
+    Every prefork child builds its own (see app.tasks.init_worker_engine),
+    so pool limits are per child: a worker holds at most concurrency x
+    (WORKER_DB_POOL_SIZE + WORKER_DB_MAX_OVERFLOW) connections.
+    """
+    from sqlmodel import create_engine
+
+    connect_args = {}
+    if SYNC_DATABASE_URL.startswith("postgresql"):
+        connect_args["application_name"] = WORKER_APPLICATION_NAME
+
+    return create_engine(
+        SYNC_DATABASE_URL, connect_args=connect_args, **_pool_args(WORKER_DB_POOL_SIZE, WORKER_DB_MAX_OVERFLOW)
+    )
@@ -0,0 +1,78 @@
+"""Encoders for streaming exports of the temperature table.
+
+Each encoder turns batches of plain row tuples into bytes, so an export
+never builds ORM or Pydantic objects and only holds one batch in memory.
+"""
+import csv
+import io
+import json
+
+EXPORT_COLUMNS = ['id', 'city', 'year', 'avg_temperature']
+
+# format: (media type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+}
+
+
+def _drain(buffer):
+    """Return and clear what was written to a StringIO/BytesIO so far"""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+async def _encode_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in batches:
+        writer.writerows(rows)
+        yield _drain(buffer).encode()
+    if buffer.tell():
+        # Header of an empty export
+        yield _drain(buffer).encode()
+
+
+async def _encode_ndjson(batches):
+    async for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows
+        ).encode()
+
+
+async def _encode_arrow(batches):
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('city', pa.string()),
+        ('year', pa.int32()),
+        ('avg_temperature', pa.float64()),
+    ])
+    buffer = io.BytesIO()
+    writer = pa.ipc.new_stream(buffer, schema)
+    async for rows in batches:
+        columns = zip(*rows)
+        writer.write_batch(pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        yield _drain(buffer)
+    writer.close()
+    yield _drain(buffer)
+
+
+ENCODERS = {
+    'csv': _encode_csv,
+    'ndjson': _encode_ndjson,
+    'arrow': _encode_arrow,
+}
+
+
+def encode_export(batches, format: str):
+    """Async iterator of response bytes for an async iterator of row batches"""
+    return ENCODERS[format](batches)
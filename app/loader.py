@@ -0,0 +1,245 @@
+import hashlib
+import io
+from typing import Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from .config import TEMPERATURE_PARTITION_YEARS, TEMPERATURE_PARTITIONING
+from .models import CityTemperature, IngestedFile
+from .partitions import ensure_partitions, is_partitioned, partition_name, swap_partition
+
+LOAD_COLUMNS = ['city', 'year', 'avg_temperature', 'temperature_sum', 'temperature_count']
+STAGING_COLUMNS = ['city', 'year', 'temperature_sum', 'temperature_count']
+
+# pg_advisory_xact_lock key held by every load transaction
+LOAD_LOCK_KEY = 72657361
+
+
+def _iter_batches(df, batch_size: int):
+    """Yield consecutive slices of the DataFrame with at most batch_size rows"""
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def file_checksum(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of the file contents, read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Ledger states of a data file
+FILE_QUEUED = 'queued'
+FILE_PROCESSING = 'processing'
+FILE_DONE = 'done'
+FILE_FAILED = 'failed'
+
+
+def get_file_entry(connection, checksum: str):
+    """Ledger row for a file checksum, or None"""
+    return connection.execute(
+        select(IngestedFile).where(IngestedFile.sha256 == checksum)
+    ).first()
+
+
+def is_path_pending(connection, path: str) -> bool:
+    """True when the path is already queued or being processed"""
+    return connection.execute(
+        select(IngestedFile.sha256).where(
+            IngestedFile.path == path,
+            IngestedFile.state.in_([FILE_QUEUED, FILE_PROCESSING]),
+        )
+    ).first() is not None
+
+
+def claim_file(connection, checksum: str, path: str, task_id: str) -> bool:
+    """Atomically register a file as queued for task_id.
+
+    Returns False when the checksum is already in the ledger, unless its
+    previous attempt failed, in which case it is claimed again.
+    """
+    table = IngestedFile.__table__
+    insert = pg_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    statement = insert(table).values(sha256=checksum, path=path, state=FILE_QUEUED, task_id=task_id)
+    statement = statement.on_conflict_do_update(
+        index_elements=['sha256'],
+        set_={'path': path, 'state': FILE_QUEUED, 'task_id': task_id, 'attempts': 0, 'updated_at': func.now()},
+        where=table.c.state == FILE_FAILED,
+    )
+    return connection.execute(statement).rowcount == 1
+
+
+def set_file_state(connection, checksum: str, state: str, records: Optional[int] = None) -> None:
+    """Move a ledger row to a new state; call inside the load transaction for FILE_DONE"""
+    values = {'state': state, 'updated_at': func.now()}
+    if records is not None:
+        values['records'] = records
+    connection.execute(
+        IngestedFile.__table__.update().where(IngestedFile.sha256 == checksum).values(**values)
+    )
+
+
+def lock_loads(connection) -> None:
+    """Serialize load transactions until the caller's transaction ends.
+
+    Concurrent loads would otherwise race in refresh_rollups (the second
+    DELETE cannot see the first one's inserted rows, so its INSERT hits
+    the primary key) and could deadlock upserting overlapping city-years.
+    SQLite already allows a single writer.
+    """
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOAD_LOCK_KEY})
+
+
+def begin_attempt(connection, checksum: str) -> None:
+    """Mark a ledger row processing and count the run in its attempts"""
+    connection.execute(
+        IngestedFile.__table__.update().where(IngestedFile.sha256 == checksum).values(
+            state=FILE_PROCESSING, attempts=IngestedFile.attempts + 1, updated_at=func.now()
+        )
+    )
+
+
+def supports_copy(connection) -> bool:
+    """True when the connection talks to PostgreSQL through a driver with COPY support"""
+    return connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+
+
+def _merge_values(table, excluded) -> dict:
+    """SET clause that adds the incoming sum/count to the stored ones"""
+    new_sum = table.c.temperature_sum + excluded.temperature_sum
+    new_count = table.c.temperature_count + excluded.temperature_count
+    return {
+        'temperature_sum': new_sum,
+        'temperature_count': new_count,
+        'avg_temperature': new_sum / new_count,
+    }
+
+
+def _copy_frame(connection, table: str, df, batch_size: int = 100000) -> None:
+    """COPY the frame's columns into table as CSV, batch_size rows per COPY"""
+    copy_sql = f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = connection.connection.cursor()
+    try:
+        for batch in _iter_batches(df, batch_size):
+            buffer = io.StringIO()
+            batch.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+    finally:
+        cursor.close()
+
+
+def load_copy(connection, df, batch_size: int = 100000) -> int:
+    """Stream the aggregated frame into a staging table with COPY FROM STDIN and upsert it"""
+    table = CityTemperature.__tablename__
+    connection.execute(text(
+        "CREATE TEMP TABLE citytemperature_staging "
+        "(city text, year integer, temperature_sum double precision, temperature_count integer) "
+        "ON COMMIT DROP"
+    ))
+
+    _copy_frame(connection, 'citytemperature_staging', df[STAGING_COLUMNS], batch_size)
+
+    connection.execute(text(
+        f"INSERT INTO {table} (city, year, avg_temperature, temperature_sum, temperature_count) "
+        "SELECT city, year, temperature_sum / temperature_count, temperature_sum, temperature_count "
+        "FROM citytemperature_staging "
+        "ON CONFLICT (city, year) DO UPDATE SET "
+        f"temperature_sum = {table}.temperature_sum + EXCLUDED.temperature_sum, "
+        f"temperature_count = {table}.temperature_count + EXCLUDED.temperature_count, "
+        f"avg_temperature = ({table}.temperature_sum + EXCLUDED.temperature_sum) "
+        f"/ ({table}.temperature_count + EXCLUDED.temperature_count)"
+    ))
+
+    return len(df)
+
+
+def load_batched_insert(connection, df, batch_size: int = 5000) -> int:
+    """Upsert the aggregated frame with multi-row INSERT ... ON CONFLICT statements"""
+    table = CityTemperature.__table__
+    insert = pg_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+
+    for batch in _iter_batches(df[LOAD_COLUMNS], batch_size):
+        statement = insert(table).values(batch.to_dict(orient='records'))
+        statement = statement.on_conflict_do_update(
+            index_elements=['city', 'year'],
+            set_=_merge_values(table, statement.excluded),
+        )
+        connection.execute(statement)
+
+    return len(df)
+
+
+def load_orm(connection, df) -> int:
+    """Merge the aggregated frame one CityTemperature object at a time"""
+    with Session(bind=connection) as session:
+        for _, row in df.iterrows():
+            city_temp = session.exec(
+                select(CityTemperature).where(
+                    CityTemperature.city == row['city'],
+                    CityTemperature.year == int(row['year']),
+                )
+            ).first()
+            if city_temp is None:
+                city_temp = CityTemperature(city=row['city'], year=int(row['year']), avg_temperature=0.0)
+            city_temp.temperature_sum += float(row['temperature_sum'])
+            city_temp.temperature_count += int(row['temperature_count'])
+            city_temp.avg_temperature = city_temp.temperature_sum / city_temp.temperature_count
+            session.add(city_temp)
+
+        session.flush()
+
+    return len(df)
+
+
+def load_swap(connection, df) -> int:
+    """Replace every year partition the frame touches with the frame's rows.
+
+    Each partition's rows are COPYed into a fresh table that is then
+    attached in place of the old partition, so a full reload of a dataset
+    writes no dead tuples. Unlike the other methods nothing is merged:
+    rows of those years that are not in the frame are gone afterwards.
+    """
+    if not is_partitioned(connection):
+        raise ValueError("The 'swap' load method needs a partitioned citytemperature table")
+
+    starts = df['year'] - df['year'] % TEMPERATURE_PARTITION_YEARS
+    for start, partition in df.groupby(starts):
+        staging_table = f"{partition_name(int(start))}_load"
+        connection.execute(text(f"DROP TABLE IF EXISTS {staging_table}"))
+        connection.execute(text(
+            f"CREATE TABLE {staging_table} (LIKE {CityTemperature.__tablename__} INCLUDING DEFAULTS)"
+        ))
+        _copy_frame(connection, staging_table, partition[LOAD_COLUMNS])
+        swap_partition(connection, int(start), staging_table)
+
+    return len(df)
+
+
+def load_dataframe(connection, df, method: str = 'copy', batch_size: int = 5000) -> int:
+    """Upsert the aggregated frame with the requested method.
+
+    Rows are merged on (city, year) by adding sum and count, so files holding
+    different months of the same city-year combine into the right mean.
+    'copy' falls back to batched inserts when the connection has no COPY
+    support, 'insert' uses batched multi-row inserts and 'orm' keeps the
+    per-row path. 'swap' replaces whole year partitions instead of merging
+    (see load_swap). The caller owns the transaction.
+    """
+    if method == 'swap':
+        return load_swap(connection, df)
+    if TEMPERATURE_PARTITIONING and connection.dialect.name == 'postgresql' and is_partitioned(connection):
+        ensure_partitions(connection, df['year'].unique())
+    if method == 'copy' and supports_copy(connection):
+        return load_copy(connection, df)
+    if method in ('copy', 'insert'):
+        return load_batched_insert(connection, df, batch_size)
+    if method == 'orm':
+        return load_orm(connection, df)
+    raise ValueError(f"Unknown load method: {method}")
@@ -1,33 +1,226 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse
-from typing import Optional
-from sqlmodel import Session, create_engine, select, SQLModel
-import pandas as pd
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from sqlalchemy import String, any_, bindparam, func, literal, text, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import select, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+import asyncio
+import base64
+import hashlib
+import json
+import orjson
 import os
+import tempfile
+import uuid
+import time
 from datetime import datetime
-from .config import CELERY_BROKER_URL, CELERY_RESULT_BACKEND, DATABASE_URL, DATA_DIR
-import celery as celery_lib
-from .models import CityTemperature, CityTemperatureRead, ETLResponse, ETLStatusResponse, TemperatureListResponse
-
-# Create Celery instance directly here
-celery = celery_lib.Celery(
-    "temperature_project",
-    broker=CELERY_BROKER_URL,
-    backend=CELERY_RESULT_BACKEND,
+from .config import (
+    COUNT_CACHE_TTL,
+    DATA_DIR,
+    ETL_STATUS_BATCH_LIMIT,
+    ETL_STATUS_STREAM_INTERVAL,
+    ETL_STATUS_STREAM_MAX_SECONDS,
+    EXPORT_BATCH_SIZE,
+    INGEST_QUEUE_LIMIT,
+    INGEST_RETRY_AFTER,
+    TEMPERATURES_BATCH_MAX_CITIES,
+    TEMPERATURES_MAX_PAGE_SIZE,
+    TEMPERATURES_PAGE_SIZE,
+    TEMPERATURE_PARTITIONING,
+    UPLOAD_CHECKSUM,
+    UPLOAD_CHUNK_SIZE,
+)
+from prometheus_client import make_asgi_app
+from .cache import ResponseCache
+from .celery_app import celery
+from .db import create_api_engine
+from .export import EXPORT_FORMATS, encode_export
+from .metrics import DB_POOL_CONNECTIONS, HTTP_REQUEST_SECONDS
+from .migrations import migrate_citytemperature, migrate_ingestedfile
+from .partitions import create_partitioned_table
+from .queues import ingest_route, queue_depth
+from .loader import FILE_FAILED, claim_file, get_file_entry, set_file_state
+from .staging import UPLOAD_EXTENSIONS
+from .models import (
+    CityDecadeTemperature,
+    CityStatsResponse,
+    CityTemperature,
+    CityTemperatureRead,
+    CityTemperatureStats,
+    DecadeTemperatureRead,
+    ETLResponse,
+    ETLStatusBatchRequest,
+    ETLStatusBatchResponse,
+    ETLStatusResponse,
+    TemperatureBatchRequest,
+    TemperatureBatchResponse,
+    TemperatureListResponse,
+    YearlyTemperature,
+    YearlyTemperatureRead,
+    YearlyTemperatureResponse,
 )
-
-# Convert async URL to sync URL for SQLModel
-SYNC_DATABASE_URL = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
 
 app = FastAPI(title="Temperature API", description="FastAPI + SQLModel + Pandas + Celery ETL API")
 
-# Database setup
-engine = create_engine(SYNC_DATABASE_URL)
+# Database setup (async engine, DATABASE_URL uses the asyncpg driver)
+engine = create_api_engine()
+
+# Pool gauges are read at scrape time (a NullPool behind PgBouncer has no counts)
+_pool = engine.sync_engine.pool
+if hasattr(_pool, "checkedout"):
+    DB_POOL_CONNECTIONS.labels('api', 'checked_out').set_function(lambda: _pool.checkedout())
+    DB_POOL_CONNECTIONS.labels('api', 'idle').set_function(lambda: _pool.checkedin())
+    DB_POOL_CONNECTIONS.labels('api', 'overflow').set_function(lambda: max(_pool.overflow(), 0))
+
+app.mount("/metrics", make_asgi_app())
+
+
+@app.middleware("http")
+async def reject_backlogged_uploads(request: Request, call_next):
+    """Answer POST /datasets with 429 while the ingest queues are full.
+
+    A middleware runs before FastAPI parses the multipart form, so a
+    rejected upload is not received or spooled to disk first.
+    """
+    if request.method == "POST" and request.url.path == "/datasets":
+        try:
+            await check_ingest_backlog()
+        except HTTPException as e:
+            return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
+    return await call_next(request)
+
+
+# Added last, so it wraps (and times) the middlewares above
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe request latency labelled by route template, so path parameters don't explode cardinality"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        if path != "/metrics":
+            HTTP_REQUEST_SECONDS.labels(request.method, path, str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+def _create_schema(connection):
+    if TEMPERATURE_PARTITIONING and connection.dialect.name == 'postgresql':
+        if not create_partitioned_table(connection, datetime.now().year):
+            print("citytemperature exists unpartitioned; TEMPERATURE_PARTITIONING needs a manual migration")
+
+    SQLModel.metadata.create_all(connection)
+    # Tables from before the upsert load lack the sum/count columns and the unique key
+    migrate_citytemperature(connection)
+    migrate_ingestedfile(connection)
+
+    # create_all skips indexes of tables that already exist; on a partitioned
+    # table they are created on the parent and cascade to every partition
+    for index in CityTemperature.__table__.indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+# Cache of serialized /temperatures responses, invalidated by each ETL load
+response_cache = ResponseCache()
 
 
 # Create tables
-def init_db():
-    SQLModel.metadata.create_all(engine)
+async def init_db():
+    async with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            await connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await connection.run_sync(_create_schema)
+
+
+async def save_upload(file: UploadFile, directory: str):
+    """Stream an upload in UPLOAD_CHUNK_SIZE chunks to a hidden temp file in directory.
+
+    The caller renames it into place once it is claimed, so the directory
+    watcher never sees a partial file. Returns (tmp_path, checksum), where
+    checksum is the SHA-256 of the contents when UPLOAD_CHECKSUM is on.
+    """
+    digest = hashlib.sha256() if UPLOAD_CHECKSUM else None
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.part')
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                if digest is not None:
+                    digest.update(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    return tmp_path, (digest.hexdigest() if digest is not None else None)
+
+
+async def check_ingest_backlog() -> None:
+    """Reject uploads with 429 while INGEST_QUEUE_LIMIT or more ingests wait in the broker.
+
+    If the broker cannot be asked, the upload is let through.
+    """
+    if not INGEST_QUEUE_LIMIT:
+        return
+    try:
+        depth = await run_in_threadpool(queue_depth, celery)
+    except Exception as e:
+        print(f"Error reading ingest queue depth: {str(e)}")
+        return
+    if depth >= INGEST_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{depth} ingests are already waiting; try again later",
+            headers={"Retry-After": str(INGEST_RETRY_AFTER)},
+        )
+
+
+async def enqueue_upload(file: UploadFile, filepath: str) -> ETLResponse:
+    """Save an upload to filepath, claim it in the file ledger and trigger the ETL task.
+
+    The ledger claim happens before the file becomes visible, so the
+    directory watcher never queues it a second time. Contents that are
+    already known are not saved again; the response points at their task.
+    """
+    task_id = str(uuid.uuid4())
+    tmp_path, checksum = await save_upload(file, os.path.dirname(filepath))
+    try:
+        if checksum is not None:
+            async with engine.begin() as connection:
+                claimed = await connection.run_sync(claim_file, checksum, filepath, task_id)
+                entry = None if claimed else await connection.run_sync(get_file_entry, checksum)
+            if not claimed:
+                os.remove(tmp_path)
+                return ETLResponse(status="duplicate", task_id=entry.task_id or "")
+        os.replace(tmp_path, filepath)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    try:
+        celery.send_task(
+            'process_temperature_data',
+            args=[filepath],
+            kwargs={'checksum': checksum},
+            task_id=task_id,
+            **ingest_route(os.path.getsize(filepath)),
+        )
+    except Exception:
+        # Release the claim so the file can be queued again
+        if checksum is not None:
+            async with engine.begin() as connection:
+                await connection.run_sync(set_file_state, checksum, FILE_FAILED)
+        raise
+
+    return ETLResponse(status="enqueued", task_id=task_id)
 
 
 # Basic endpoints
@@ -44,130 +237,417 @@ async def health_check():
 # Upload CSV endpoint
 @app.post("/datasets", response_model=ETLResponse)
 async def upload_csv(file: UploadFile = File(...)):
-    """Upload a CSV file and trigger ETL process"""
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    """Upload a CSV (or Parquet/Arrow IPC) file and trigger ETL process"""
+    if not file.filename.endswith(UPLOAD_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Only CSV, Parquet or Arrow files are allowed")
     
-    # Save uploaded file
+    # Save uploaded file; the uuid keeps uploads within the same second apart
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"temperature_data_{timestamp}.csv"
+    extension = os.path.splitext(file.filename)[1]
+    filename = f"temperature_data_{timestamp}_{uuid.uuid4().hex}{extension}"
     filepath = os.path.join(DATA_DIR, filename)
     
     # Ensure data directory exists
     os.makedirs(DATA_DIR, exist_ok=True)
     
-    # Save file
-    with open(filepath, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
-    
-    # Trigger ETL task
-    task = celery.send_task('process_temperature_data', args=[filepath])
-    
-    return ETLResponse(status="enqueued", task_id=task.id)
+    # Save file and trigger ETL task
+    return await enqueue_upload(file, filepath)
+
+
+# Task states after which a task's status no longer changes
+TERMINAL_STATES = ('SUCCESS', 'FAILURE', 'REVOKED')
+
+
+def _status_from_meta(task_id: str, status: str, result) -> ETLStatusResponse:
+    response = ETLStatusResponse(status=status, task_id=task_id)
+    if status == 'SUCCESS':
+        response.result = str(result)
+    elif status == 'FAILURE':
+        response.error = str(result)
+    elif isinstance(result, dict):
+        response.progress = result
+    return response
+
+
+def fetch_task_statuses(task_ids: List[str]) -> List[ETLStatusResponse]:
+    """Statuses of many tasks, fetched with a single MGET on key-value result backends"""
+    backend = celery.backend
+    if hasattr(backend, 'mget') and hasattr(backend, 'get_key_for_task'):
+        keys = [backend.get_key_for_task(task_id) for task_id in task_ids]
+        values = backend.mget(keys)
+        if isinstance(values, dict):
+            # Cache/Memcached backends return {key: value} holding only the keys found
+            values = [values.get(key) for key in keys]
+        statuses = []
+        for task_id, value in zip(task_ids, values):
+            meta = backend.decode_result(value) if value else {'status': 'PENDING', 'result': None}
+            statuses.append(_status_from_meta(task_id, meta['status'], meta.get('result')))
+        return statuses
+
+    statuses = []
+    for task_id in task_ids:
+        task = celery.AsyncResult(task_id)
+        statuses.append(_status_from_meta(task_id, task.state, task.info))
+    return statuses
+
+
+@app.post("/etl/status", response_model=ETLStatusBatchResponse)
+async def get_etl_statuses(request: ETLStatusBatchRequest):
+    """Get the status of many ETL tasks in one request"""
+    if len(request.task_ids) > ETL_STATUS_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {ETL_STATUS_BATCH_LIMIT} task ids per request")
+
+    statuses = await run_in_threadpool(fetch_task_statuses, request.task_ids)
+    return ETLStatusBatchResponse(statuses=statuses)
+
+
+@app.get("/etl/status/stream")
+async def stream_etl_status(task_ids: str = Query(..., description="Comma-separated task ids")):
+    """Server-sent events with status/progress updates for the given tasks.
+
+    An event is sent whenever a task's status or progress changes; the
+    stream ends once every task has finished, or with a `timeout` event
+    after ETL_STATUS_STREAM_MAX_SECONDS (an unknown id never finishes).
+    """
+    ids = [task_id for task_id in task_ids.split(",") if task_id]
+    if not ids or len(ids) > ETL_STATUS_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {ETL_STATUS_BATCH_LIMIT} task ids required")
+
+    async def events():
+        last_sent = {}
+        pending = list(ids)
+        deadline = time.monotonic() + ETL_STATUS_STREAM_MAX_SECONDS
+        while pending:
+            if time.monotonic() >= deadline:
+                yield f"event: timeout\ndata: {json.dumps({'pending': pending})}\n\n"
+                return
+            for status in await run_in_threadpool(fetch_task_statuses, pending):
+                payload = status.json()
+                if last_sent.get(status.task_id) != payload:
+                    last_sent[status.task_id] = payload
+                    yield f"event: status\ndata: {payload}\n\n"
+                if status.status in TERMINAL_STATES:
+                    pending.remove(status.task_id)
+            if pending:
+                await asyncio.sleep(ETL_STATUS_STREAM_INTERVAL)
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.get("/etl/status/{task_id}", response_model=ETLStatusResponse)
 async def get_etl_status(task_id: str):
     """Get the status of an ETL task"""
-    task = celery.AsyncResult(task_id)
-    
-    status = task.state
-    result = None
-    error = None
-    
-    if task.state == 'SUCCESS':
-        result = str(task.result)
-    elif task.state == 'FAILURE':
-        error = str(task.result)
-    
-    return ETLStatusResponse(status=status, task_id=task_id, result=result, error=error)
+    return (await run_in_threadpool(fetch_task_statuses, [task_id]))[0]
 
 
-@app.get("/temperatures", response_model=TemperatureListResponse)
-async def get_temperatures(
-    page: int = Query(1, ge=1),
-    city: Optional[str] = Query(None),
-    year: Optional[int] = Query(None)
-):
-    """Get paginated temperature data with optional filters"""
-    page_size = 20
-    offset = (page - 1) * page_size
-    
-    with Session(engine) as session:
-        query = select(CityTemperature)
-        
-        # Apply filters
-        if city:
+# Short-lived cache of COUNT(*) results keyed by filters: {(city, year): (expires_at, count)}
+_count_cache = {}
+
+
+def encode_cursor(city: str, year: int, temperature_id: int) -> str:
+    """Opaque keyset cursor pointing at the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps([city, year, temperature_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises HTTP 400 on malformed cursors"""
+    try:
+        city, year, temperature_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(city), int(year), int(temperature_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_filters(query, city: Optional[str], year: Optional[int], city_match: str = "contains"):
+    """Apply the optional city/year filters shared by listing and counting.
+
+    city_match selects how city is compared: "contains" (case-insensitive
+    substring, served by the trigram index), "prefix" or "exact" (both
+    served by B-tree indexes, case-sensitive).
+    """
+    if city:
+        if city_match == "exact":
+            query = query.where(CityTemperature.city == city)
+        elif city_match == "prefix":
+            query = query.where(CityTemperature.city.startswith(city, autoescape=True))
+        else:
             query = query.where(CityTemperature.city.ilike(f"%{city}%"))
-        if year:
-            query = query.where(CityTemperature.year == year)
-        
-        # Get total count
-        count_query = select(CityTemperature)
-        if city:
-            count_query = count_query.where(CityTemperature.city.ilike(f"%{city}%"))
-        if year:
-            count_query = count_query.where(CityTemperature.year == year)
-        
-        total_count = len(session.exec(count_query).all())
+    if year:
+        query = query.where(CityTemperature.year == year)
+    return query
+
+
+async def count_temperatures(
+    session: AsyncSession,
+    city: Optional[str],
+    year: Optional[int],
+    city_match: str = "contains",
+    generation: Optional[int] = None,
+) -> int:
+    """SQL COUNT(*) of the matching rows, cached for COUNT_CACHE_TTL seconds or until the next load"""
+    key = (generation, city, year, city_match)
+    now = time.monotonic()
+    cached = _count_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    count_query = apply_filters(select(func.count()).select_from(CityTemperature), city, year, city_match)
+    total_count = (await session.exec(count_query)).one()
+
+    if len(_count_cache) > 1024:
+        _count_cache.clear()
+    _count_cache[key] = (now + COUNT_CACHE_TTL, total_count)
+    return total_count
+
+
+async def query_temperatures(
+    page: int,
+    city: Optional[str],
+    year: Optional[int],
+    city_match: str,
+    page_size: int,
+    cursor: Optional[str],
+    generation: Optional[int] = None,
+) -> TemperatureListResponse:
+    """Run the listing query behind GET /temperatures"""
+    async with AsyncSession(engine) as session:
+        query = apply_filters(select(CityTemperature), city, year, city_match)
+        query = query.order_by(CityTemperature.city, CityTemperature.year, CityTemperature.id)
+
+        if cursor:
+            last_city, last_year, last_id = decode_cursor(cursor)
+            query = query.where(
+                tuple_(CityTemperature.city, CityTemperature.year, CityTemperature.id)
+                > tuple_(literal(last_city), literal(last_year), literal(last_id))
+            )
+        else:
+            query = query.offset((page - 1) * page_size)
+
+        total_count = await count_temperatures(session, city, year, city_match, generation)
         total_pages = (total_count + page_size - 1) // page_size
         
-        # Get paginated results
-        query = query.offset(offset).limit(page_size)
-        results = session.exec(query).all()
+        # Fetch one extra row to know whether there is a next page
+        results = (await session.exec(query.limit(page_size + 1))).all()
+        has_next = len(results) > page_size
+        results = results[:page_size]
         
         data = [CityTemperatureRead(**result.dict()) for result in results]
+        next_cursor = None
+        if has_next:
+            last = results[-1]
+            next_cursor = encode_cursor(last.city, last.year, last.id)
         
         return TemperatureListResponse(
             page=page,
             total_pages=total_pages,
-            data=data
+            data=data,
+            next_cursor=next_cursor
         )
 
 
+async def cached_response(compute, *key_parts, encode=None):
+    """Serve compute(generation)'s response from the response cache when possible.
+
+    compute is an async callable returning a response model; HTTP errors it
+    raises are not cached. Without a cache generation it is simply awaited.
+    encode, if given, turns compute's result into JSON bytes instead of the
+    response model's own serializer.
+    """
+    generation = await response_cache.generation()
+    if generation is None:
+        response = await compute(None)
+        if encode is None:
+            return response
+        return Response(content=encode(response), media_type="application/json")
+
+    key = response_cache.key(generation, *key_parts)
+    content = await response_cache.get(key)
+    if content is None:
+        response = await compute(generation)
+        content = encode(response) if encode is not None else response.json().encode()
+        await response_cache.set(key, content)
+
+    return Response(content=content, media_type="application/json")
+
+
+@app.get("/temperatures", response_model=TemperatureListResponse)
+async def get_temperatures(
+    page: int = Query(1, ge=1),
+    city: Optional[str] = Query(None),
+    year: Optional[int] = Query(None),
+    city_match: str = Query("contains", pattern="^(contains|prefix|exact)$"),
+    page_size: int = Query(TEMPERATURES_PAGE_SIZE, ge=1, le=TEMPERATURES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from a previous page; replaces page"),
+):
+    """Get paginated temperature data with optional filters.
+
+    Pages can be addressed by number (OFFSET) or, for constant-time deep
+    paging, by the opaque next_cursor returned with every page.
+    """
+    async def compute(generation):
+        return await query_temperatures(page, city, year, city_match, page_size, cursor, generation)
+
+    return await cached_response(compute, "list", city, year, city_match, page_size, cursor or page)
+
+
+async def stream_temperature_rows(city: Optional[str], year: Optional[int], city_match: str):
+    """Yield the matching rows in EXPORT_BATCH_SIZE batches of plain tuples from a server-side cursor"""
+    query = select(
+        CityTemperature.id, CityTemperature.city, CityTemperature.year, CityTemperature.avg_temperature
+    )
+    query = apply_filters(query, city, year, city_match).order_by(CityTemperature.city, CityTemperature.year)
+
+    async with engine.connect() as connection:
+        result = await connection.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions(EXPORT_BATCH_SIZE):
+            yield rows
+
+
+@app.get("/temperatures/export")
+async def export_temperatures(
+    format: str = Query("csv", pattern="^(csv|ndjson|arrow)$"),
+    city: Optional[str] = Query(None),
+    year: Optional[int] = Query(None),
+    city_match: str = Query("contains", pattern="^(contains|prefix|exact)$"),
+):
+    """Stream every matching row as CSV, NDJSON or an Arrow IPC stream.
+
+    Meant for bulk consumers: no pagination or count, and memory stays at
+    one batch regardless of how many rows match.
+    """
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        encode_export(stream_temperature_rows(city, year, city_match), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="temperatures.{extension}"'},
+    )
+
+
+@app.get("/temperatures/stats/{city}", response_model=CityStatsResponse)
+async def get_city_stats(city: str):
+    """Per-city statistics (min/max/mean/trend) and decade averages from the rollup tables"""
+    async def compute(generation):
+        async with AsyncSession(engine) as session:
+            stats = await session.get(CityTemperatureStats, city)
+            if not stats:
+                raise HTTPException(status_code=404, detail="City not found")
+
+            decades = (await session.exec(
+                select(CityDecadeTemperature)
+                .where(CityDecadeTemperature.city == city)
+                .order_by(CityDecadeTemperature.decade)
+            )).all()
+
+            return CityStatsResponse(
+                **stats.dict(),
+                decades=[DecadeTemperatureRead(**decade.dict()) for decade in decades]
+            )
+
+    return await cached_response(compute, "stats", city)
+
+
+@app.post("/temperatures/batch", response_model=TemperatureBatchResponse)
+async def get_temperatures_batch(request: TemperatureBatchRequest):
+    """Yearly averages of many cities in one query, as columnar JSON.
+
+    Cities are matched exactly; each maps to parallel `years` and
+    `temperatures` arrays (empty when the city has no data in the range).
+    """
+    cities = list(dict.fromkeys(city.strip() for city in request.cities if city.strip()))
+    if not cities:
+        raise HTTPException(status_code=400, detail="At least one city is required")
+    if len(cities) > TEMPERATURES_BATCH_MAX_CITIES:
+        raise HTTPException(status_code=400, detail=f"At most {TEMPERATURES_BATCH_MAX_CITIES} cities per request")
+
+    async def compute(generation):
+        if engine.dialect.name == 'postgresql':
+            # One array parameter: the same plan whatever the number of cities
+            city_filter = CityTemperature.city == any_(bindparam("cities", cities, type_=ARRAY(String)))
+        else:
+            city_filter = CityTemperature.city.in_(cities)
+
+        query = select(
+            CityTemperature.city, CityTemperature.year, CityTemperature.avg_temperature
+        ).where(city_filter)
+        if request.from_year is not None:
+            query = query.where(CityTemperature.year >= request.from_year)
+        if request.to_year is not None:
+            query = query.where(CityTemperature.year <= request.to_year)
+        query = query.order_by(CityTemperature.city, CityTemperature.year)
+
+        series = {city: {"years": [], "temperatures": []} for city in cities}
+        async with engine.connect() as connection:
+            for city, year, temperature in await connection.execute(query):
+                series[city]["years"].append(year)
+                series[city]["temperatures"].append(temperature)
+
+        return {"from_year": request.from_year, "to_year": request.to_year, "cities": series}
+
+    cities_key = hashlib.sha256(orjson.dumps(sorted(cities))).hexdigest()
+    return await cached_response(
+        compute, "batch", cities_key, request.from_year, request.to_year, encode=orjson.dumps
+    )
+
+
+@app.get("/temperatures/yearly", response_model=YearlyTemperatureResponse)
+async def get_yearly_temperatures(
+    from_year: Optional[int] = Query(None),
+    to_year: Optional[int] = Query(None),
+):
+    """Global mean of the city averages for each year, from the rollup table"""
+    async def compute(generation):
+        async with AsyncSession(engine) as session:
+            query = select(YearlyTemperature).order_by(YearlyTemperature.year)
+            if from_year is not None:
+                query = query.where(YearlyTemperature.year >= from_year)
+            if to_year is not None:
+                query = query.where(YearlyTemperature.year <= to_year)
+
+            results = (await session.exec(query)).all()
+            return YearlyTemperatureResponse(
+                data=[YearlyTemperatureRead(**result.dict()) for result in results]
+            )
+
+    return await cached_response(compute, "yearly", from_year, to_year)
+
+
 @app.get("/temperatures/{temperature_id}", response_model=CityTemperatureRead)
 async def get_temperature_by_id(temperature_id: int):
     """Get a specific temperature record by ID"""
-    with Session(engine) as session:
-        temperature = session.get(CityTemperature, temperature_id)
-        if not temperature:
-            raise HTTPException(status_code=404, detail="Temperature record not found")
-        
-        return CityTemperatureRead(**temperature.dict())
+    async def compute(generation):
+        async with AsyncSession(engine) as session:
+            temperature = await session.get(CityTemperature, temperature_id)
+            if not temperature:
+                raise HTTPException(status_code=404, detail="Temperature record not found")
+            
+            return CityTemperatureRead(**temperature.dict())
+
+    return await cached_response(compute, "item", temperature_id)
 
 
 # POST endpoint to trigger ETL process
 @app.post("/datasets", response_model=ETLResponse)
 async def upload_dataset(file: UploadFile = File(...)):
-    """Upload a CSV file and trigger the ETL process"""
-    # Validate that it's a CSV file
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    """Upload a CSV (or Parquet/Arrow IPC) file and trigger the ETL process"""
+    # Validate that it's a supported data file
+    if not file.filename.endswith(UPLOAD_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Only CSV, Parquet or Arrow files are allowed")
     
     # Ensure data directory exists
     os.makedirs(DATA_DIR, exist_ok=True)
     
     # Generate unique filename
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_{file.filename}"
+    filename = f"{timestamp}_{uuid.uuid4().hex}_{os.path.basename(file.filename)}"
     filepath = os.path.join(DATA_DIR, filename)
     
-    # Save file
+    # Save file and trigger Celery task
     try:
-        with open(filepath, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Trigger Celery task
-        task = celery.send_task('process_temperature_data', args=[filepath])
-        
-        # Return response according to requirements
-        return ETLResponse(
-            status="enqueued",
-            task_id=task.id
-        )
+        return await enqueue_upload(file, filepath)
     
+    except HTTPException:
+        raise
     except Exception as e:
         # Clean up file in case of error
         if os.path.exists(filepath):
@@ -180,19 +660,7 @@ async def upload_dataset(file: UploadFile = File(...)):
 async def get_etl_status(task_id: str):
     """Get the status of an ETL task"""
     try:
-        task = celery.AsyncResult(task_id)
-        
-        response = ETLStatusResponse(
-            task_id=task_id,
-            status=task.state
-        )
-        
-        if task.state == 'SUCCESS':
-            response.result = str(task.result)
-        elif task.state == 'FAILURE':
-            response.error = str(task.result)
-        
-        return response
+        return (await run_in_threadpool(fetch_task_statuses, [task_id]))[0]
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking task status: {str(e)}")
@@ -201,4 +669,10 @@ async def get_etl_status(task_id: str):
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    await init_db()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await response_cache.close()
+    await engine.dispose()
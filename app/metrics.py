@@ -0,0 +1,94 @@
+"""Prometheus metrics shared by the API and the Celery worker.
+
+The worker runs tasks in prefork children, so its exporter aggregates
+per-process samples when PROMETHEUS_MULTIPROC_DIR is set.
+"""
+import os
+import resource
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server
+
+ETL_STAGE_SECONDS = Histogram(
+    'etl_stage_seconds',
+    'Time spent in each ETL stage per task',
+    ['stage'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+ETL_ROWS = Counter('etl_rows_total', 'Rows handled by the ETL', ['kind'])
+ETL_TASKS = Counter('etl_tasks_total', 'ETL tasks by outcome', ['outcome'])
+ETL_TASK_PEAK_RSS = Histogram(
+    'etl_task_peak_rss_bytes',
+    'Peak RSS of the worker process during each ETL task',
+    buckets=tuple(2 ** power * 1024 * 1024 for power in range(5, 14)),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Database pool connections by state',
+    ['service', 'state'],
+    multiprocess_mode='livesum',
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'API request latency by route',
+    ['method', 'route', 'status'],
+)
+CACHE_REQUESTS = Counter('response_cache_requests_total', 'Response cache lookups', ['result'])
+
+
+def reset_peak_rss() -> bool:
+    """Reset this process's RSS high-water mark, so the next reading covers one task.
+
+    Only Linux supports it (writing 5 to /proc/self/clear_refs); returns
+    False elsewhere, where ru_maxrss only ever grows over the process's life.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_bytes() -> int:
+    """High-water mark of this process's resident set size since the last reset_peak_rss"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def record_pool(service: str, pool) -> None:
+    """Snapshot a SQLAlchemy QueuePool's connection counts (NullPool has none)"""
+    if not hasattr(pool, 'checkedout'):
+        return
+    DB_POOL_CONNECTIONS.labels(service, 'checked_out').set(pool.checkedout())
+    DB_POOL_CONNECTIONS.labels(service, 'idle').set(pool.checkedin())
+    DB_POOL_CONNECTIONS.labels(service, 'overflow').set(max(pool.overflow(), 0))
+
+
+def observe_stages(timings: dict) -> None:
+    for stage, seconds in timings.items():
+        ETL_STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def start_worker_exporter(port: int) -> None:
+    """Serve worker metrics over HTTP, merging prefork children when multiprocess mode is on"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
+
+
+def mark_process_dead(pid: int) -> None:
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,80 @@
+"""In-place upgrades of tables created by earlier versions of the app.
+
+create_all only creates missing tables, so init_db runs these to bring an
+existing database up to the current models. Every step is idempotent.
+"""
+from sqlalchemy import inspect, text
+
+from .models import CityTemperature, IngestedFile
+
+TABLE = CityTemperature.__tablename__
+UNIQUE_NAME = f"uq_{TABLE}_city_year"
+
+# Merge the duplicate (city, year) rows the append-only load wrote into the
+# lowest id, then drop the rest
+MERGE_DUPLICATES_SQL = f"""
+UPDATE {TABLE} SET
+    temperature_sum = merged.temperature_sum,
+    temperature_count = merged.temperature_count,
+    avg_temperature = merged.temperature_sum / merged.temperature_count
+FROM (
+    SELECT MIN(id) AS id, SUM(temperature_sum) AS temperature_sum, SUM(temperature_count) AS temperature_count
+    FROM {TABLE}
+    GROUP BY city, year
+    HAVING COUNT(*) > 1
+) AS merged
+WHERE {TABLE}.id = merged.id
+"""
+DELETE_DUPLICATES_SQL = f"""
+DELETE FROM {TABLE}
+WHERE EXISTS (
+    SELECT 1 FROM {TABLE} AS kept
+    WHERE kept.city = {TABLE}.city AND kept.year = {TABLE}.year AND kept.id < {TABLE}.id
+)
+"""
+
+
+def migrate_ingestedfile(connection) -> None:
+    """Add the attempts counter to a ledger created before redeliveries were capped"""
+    table = IngestedFile.__tablename__
+    columns = {column['name'] for column in inspect(connection).get_columns(table)}
+    if 'attempts' not in columns:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"))
+
+
+def _has_city_year_unique(inspector) -> bool:
+    wanted = ['city', 'year']
+    constraints = inspector.get_unique_constraints(TABLE)
+    indexes = [index for index in inspector.get_indexes(TABLE) if index.get('unique')]
+    return any(item['column_names'] == wanted for item in constraints + indexes)
+
+
+def migrate_citytemperature(connection) -> None:
+    """Upgrade a citytemperature created before the upsert load.
+
+    Adds the temperature_sum/temperature_count columns (each existing row
+    counts as one reading of its average), merges duplicate city-years and
+    adds the (city, year) unique constraint ON CONFLICT relies on. Runs
+    inside init_db's transaction, so a failure aborts startup untouched.
+    """
+    inspector = inspect(connection)
+    columns = {column['name'] for column in inspector.get_columns(TABLE)}
+
+    if 'temperature_sum' not in columns:
+        connection.execute(text(f"ALTER TABLE {TABLE} ADD COLUMN temperature_sum FLOAT NOT NULL DEFAULT 0"))
+        connection.execute(text(f"UPDATE {TABLE} SET temperature_sum = avg_temperature"))
+    if 'temperature_count' not in columns:
+        connection.execute(text(f"ALTER TABLE {TABLE} ADD COLUMN temperature_count INTEGER NOT NULL DEFAULT 0"))
+        connection.execute(text(f"UPDATE {TABLE} SET temperature_count = 1"))
+
+    if _has_city_year_unique(inspector):
+        return
+
+    print(f"Migrating {TABLE}: merging duplicate city-years and adding {UNIQUE_NAME}")
+    connection.execute(text(MERGE_DUPLICATES_SQL))
+    connection.execute(text(DELETE_DUPLICATES_SQL))
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT {UNIQUE_NAME} UNIQUE (city, year)"))
+    else:
+        # SQLite cannot add constraints to an existing table; a unique index serves ON CONFLICT too
+        connection.execute(text(f"CREATE UNIQUE INDEX {UNIQUE_NAME} ON {TABLE} (city, year)"))
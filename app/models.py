@@ -1,13 +1,85 @@
-from typing import Optional, List
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, List
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, SQLModel
 
 
 class CityTemperature(SQLModel, table=True, table_name="citytemperature"):
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # Also serves as the composite (city, year) B-tree index
+        UniqueConstraint("city", "year", name="uq_citytemperature_city_year"),
+        Index("ix_citytemperature_year", "year"),
+        # Prefix filters (LIKE 'abc%') regardless of the database collation
+        Index("ix_citytemperature_city_pattern", "city", postgresql_ops={"city": "text_pattern_ops"}),
+        # Substring filters (ILIKE '%abc%'); requires the pg_trgm extension
+        Index(
+            "ix_citytemperature_city_trgm",
+            "city",
+            postgresql_using="gin",
+            postgresql_ops={"city": "gin_trgm_ops"},
+        ),
+        {"extend_existing": True},
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     city: str
     year: int
     avg_temperature: float
+    # Running totals so partial uploads of the same city-year can be merged
+    temperature_sum: float = 0.0
+    temperature_count: int = 0
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class IngestedFile(SQLModel, table=True):
+    """Ledger of data files keyed by content checksum.
+
+    state moves queued -> processing -> done (or failed), so each file is
+    processed exactly once no matter how many times it is enqueued.
+    """
+    __table_args__ = {"extend_existing": True}
+    sha256: str = Field(primary_key=True)
+    path: str = Field(index=True)
+    state: str = "queued"
+    task_id: Optional[str] = None
+    records: int = 0
+    # Runs started for the current claim, redeliveries included
+    attempts: int = 0
+    ingested_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
+
+
+class CityTemperatureStats(SQLModel, table=True):
+    """Rollup: per-city statistics over all years, rebuilt after each ETL load"""
+    __table_args__ = {"extend_existing": True}
+    city: str = Field(primary_key=True)
+    first_year: int
+    last_year: int
+    years: int
+    min_temperature: float
+    max_temperature: float
+    mean_temperature: float
+    # Least-squares trend of the yearly averages, in degrees per year
+    slope_per_year: Optional[float] = None
+
+
+class CityDecadeTemperature(SQLModel, table=True):
+    """Rollup: per-city average temperature for each decade"""
+    __table_args__ = {"extend_existing": True}
+    city: str = Field(primary_key=True)
+    decade: int = Field(primary_key=True)
+    avg_temperature: float
+    years: int
+
+
+class YearlyTemperature(SQLModel, table=True):
+    """Rollup: global mean of the city averages for each year"""
+    __table_args__ = {"extend_existing": True}
+    year: int = Field(primary_key=True)
+    avg_temperature: float
+    cities: int
 
 
 class CityTemperatureRead(SQLModel):
@@ -27,9 +99,66 @@ class ETLStatusResponse(SQLModel):
     task_id: str
     result: Optional[str] = None
     error: Optional[str] = None
+    # Published by the worker while the task is in the PROGRESS state
+    progress: Optional[Dict[str, Any]] = None
+
+
+class ETLStatusBatchRequest(SQLModel):
+    task_ids: List[str]
+
+
+class ETLStatusBatchResponse(SQLModel):
+    statuses: List[ETLStatusResponse]
 
 
 class TemperatureListResponse(SQLModel):
     page: int
     total_pages: int
     data: List[CityTemperatureRead]
+    next_cursor: Optional[str] = None
+
+
+class DecadeTemperatureRead(SQLModel):
+    decade: int
+    avg_temperature: float
+    years: int
+
+
+class CityStatsResponse(SQLModel):
+    city: str
+    first_year: int
+    last_year: int
+    years: int
+    min_temperature: float
+    max_temperature: float
+    mean_temperature: float
+    slope_per_year: Optional[float] = None
+    decades: List[DecadeTemperatureRead]
+
+
+class TemperatureBatchRequest(SQLModel):
+    cities: List[str]
+    from_year: Optional[int] = None
+    to_year: Optional[int] = None
+
+
+class CityTemperatureSeries(SQLModel):
+    """One city's yearly averages as parallel arrays"""
+    years: List[int]
+    temperatures: List[float]
+
+
+class TemperatureBatchResponse(SQLModel):
+    from_year: Optional[int] = None
+    to_year: Optional[int] = None
+    cities: Dict[str, CityTemperatureSeries]
+
+
+class YearlyTemperatureRead(SQLModel):
+    year: int
+    avg_temperature: float
+    cities: int
+
+
+class YearlyTemperatureResponse(SQLModel):
+    data: List[YearlyTemperatureRead]
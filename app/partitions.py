@@ -0,0 +1,132 @@
+"""Optional range partitioning of citytemperature by year (PostgreSQL only).
+
+With TEMPERATURE_PARTITIONING on, init_db creates citytemperature as a
+table partitioned by year in TEMPERATURE_PARTITION_YEARS-wide ranges, so
+year filters prune to one partition and a range can be replaced by
+attaching a freshly loaded table instead of rewriting rows in place.
+"""
+from sqlalchemy import bindparam, text
+
+from .config import TEMPERATURE_PARTITION_FIRST_YEAR, TEMPERATURE_PARTITION_YEARS
+from .models import CityDecadeTemperature, CityTemperature, CityTemperatureStats, YearlyTemperature
+
+TABLE = CityTemperature.__tablename__
+
+# PostgreSQL requires the partition key in every unique constraint, so the
+# primary key becomes (id, year); (city, year) already contains it
+PARTITIONED_TABLE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    id SERIAL NOT NULL,
+    city VARCHAR NOT NULL,
+    year INTEGER NOT NULL,
+    avg_temperature FLOAT NOT NULL,
+    temperature_sum FLOAT NOT NULL DEFAULT 0,
+    temperature_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (id, year),
+    CONSTRAINT uq_{TABLE}_city_year UNIQUE (city, year)
+) PARTITION BY RANGE (year)
+"""
+
+
+def partition_range(year: int) -> tuple:
+    """[start, end) bounds of the partition holding year"""
+    start = year - year % TEMPERATURE_PARTITION_YEARS
+    return start, start + TEMPERATURE_PARTITION_YEARS
+
+
+def partition_name(start: int) -> str:
+    return f"{TABLE}_y{start}"
+
+
+def is_partitioned(connection) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ), {"table": TABLE}).first() is not None
+
+
+def create_partitioned_table(connection, last_year: int) -> bool:
+    """Create the partitioned table with ranges from TEMPERATURE_PARTITION_FIRST_YEAR to last_year.
+
+    Returns False, leaving the table alone, when an unpartitioned
+    citytemperature already exists; it has to be migrated by hand.
+    """
+    exists = connection.execute(text("SELECT to_regclass(:table)"), {"table": TABLE}).scalar()
+    if exists and not is_partitioned(connection):
+        return False
+
+    connection.execute(text(PARTITIONED_TABLE_SQL))
+    ensure_partitions(
+        connection, range(TEMPERATURE_PARTITION_FIRST_YEAR, last_year + 1, TEMPERATURE_PARTITION_YEARS)
+    )
+    return True
+
+
+def ensure_partitions(connection, years) -> None:
+    """Create the partitions covering years that do not exist yet"""
+    for start in sorted({partition_range(int(year))[0] for year in years}):
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ({start}) TO ({start + TEMPERATURE_PARTITION_YEARS})"
+        ))
+
+
+def swap_partition(connection, start: int, staging_table: str) -> None:
+    """Replace the partition starting at start with staging_table.
+
+    staging_table must have citytemperature's columns. A CHECK constraint
+    matching the bounds lets ATTACH skip its validation scan; the old
+    partition is dropped, so the swap is one short exclusive lock instead
+    of an UPDATE of every row. Runs inside the caller's transaction.
+    """
+    end = start + TEMPERATURE_PARTITION_YEARS
+    name = partition_name(start)
+    connection.execute(text(
+        f"ALTER TABLE {staging_table} ADD CONSTRAINT {staging_table}_bounds "
+        f"CHECK (year IS NOT NULL AND year >= {start} AND year < {end})"
+    ))
+
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+        connection.execute(text(f"DROP TABLE {name}"))
+
+    connection.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {staging_table} FOR VALUES FROM ({start}) TO ({end})"
+    ))
+    connection.execute(text(f"ALTER TABLE {staging_table} RENAME TO {name}"))
+    connection.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {staging_table}_bounds"))
+
+
+# The fact table (or its partitions, found through pg_inherits) and the
+# rollups, which are rewritten by every load
+MAINTENANCE_TABLES_SQL = """
+SELECT s.relname, s.n_live_tup, s.n_dead_tup, s.n_mod_since_analyze, i.inhrelid IS NOT NULL AS is_partition
+FROM pg_stat_user_tables s
+LEFT JOIN pg_inherits i ON i.inhrelid = s.relid AND i.inhparent = to_regclass(:table)
+WHERE i.inhrelid IS NOT NULL
+   OR s.relname IN :tables
+"""
+MAINTENANCE_TABLES = (
+    TABLE,
+    CityTemperatureStats.__tablename__,
+    CityDecadeTemperature.__tablename__,
+    YearlyTemperature.__tablename__,
+)
+
+
+def tables_needing_maintenance(connection, min_rows: int, compact_ratio: float) -> list:
+    """[(table, 'compact' | 'vacuum')] for tables changed by at least min_rows rows.
+
+    A partition whose dead tuples exceed compact_ratio of its live ones is
+    rewritten (VACUUM FULL), which locks out readers of that partition
+    only. Everything else, including an unpartitioned citytemperature that
+    every API read hits, just gets VACUUM (ANALYZE).
+    """
+    actions = []
+    statement = text(MAINTENANCE_TABLES_SQL).bindparams(bindparam("tables", expanding=True))
+    rows = connection.execute(statement, {"table": TABLE, "tables": list(MAINTENANCE_TABLES)})
+    for name, live, dead, modified, is_partition in rows:
+        if max(dead, modified) < min_rows:
+            continue
+        compact = is_partition and live and dead / live >= compact_ratio
+        actions.append((name, 'compact' if compact else 'vacuum'))
+    return actions
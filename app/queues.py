@@ -0,0 +1,66 @@
+"""Celery queue layout shared by the API (which enqueues) and the worker.
+
+Ingests are split by file size so a multi-GB load never sits in front of
+small uploads, and housekeeping tasks get a queue of their own so health
+checks and scans run even while every ingest slot is busy. Partition
+sub-tasks of fanned-out files (ETL_PARTITIONS > 1) go to a queue that
+every ingest worker consumes, so they run in parallel.
+"""
+from .config import (
+    CELERY_INGEST_QUEUE,
+    CELERY_LARGE_INGEST_QUEUE,
+    CELERY_MAINTENANCE_QUEUE,
+    CELERY_PARTITION_QUEUE,
+    CELERY_VISIBILITY_TIMEOUT,
+    INGEST_LARGE_FILE_BYTES,
+)
+
+INGEST_QUEUES = (CELERY_INGEST_QUEUE, CELERY_LARGE_INGEST_QUEUE)
+
+# Redis has no native priorities: kombu keeps one list per step and pops
+# lower (more urgent) steps first. Both publishers and consumers need it.
+PRIORITY_STEPS = list(range(10))
+TRANSPORT_OPTIONS = {
+    "priority_steps": PRIORITY_STEPS,
+    "queue_order_strategy": "priority",
+    "visibility_timeout": CELERY_VISIBILITY_TIMEOUT,
+}
+
+TASK_ROUTES = {
+    'process_temperature_data': {'queue': CELERY_INGEST_QUEUE},
+    # Partitions of a fanned-out file are bounded in size, so every ingest
+    # worker takes them; on the single-slot large-ingest worker alone they
+    # would run one after another
+    'aggregate_csv_partition': {'queue': CELERY_PARTITION_QUEUE},
+    'load_partitioned_aggregates': {'queue': CELERY_PARTITION_QUEUE},
+    'discard_file': {'queue': CELERY_PARTITION_QUEUE},
+    'monitor_data_directory': {'queue': CELERY_MAINTENANCE_QUEUE},
+    'health_check_task': {'queue': CELERY_MAINTENANCE_QUEUE},
+    'maintain_temperature_tables': {'queue': CELERY_MAINTENANCE_QUEUE},
+}
+
+
+def ingest_route(size_bytes: int) -> dict:
+    """apply_async/send_task options for ingesting a file of size_bytes.
+
+    Files from INGEST_LARGE_FILE_BYTES up go to the large-ingest queue;
+    within a queue smaller files get more urgent priorities.
+    """
+    if size_bytes >= INGEST_LARGE_FILE_BYTES:
+        return {'queue': CELERY_LARGE_INGEST_QUEUE, 'priority': PRIORITY_STEPS[-1]}
+    step = len(PRIORITY_STEPS) * size_bytes // INGEST_LARGE_FILE_BYTES
+    return {'queue': CELERY_INGEST_QUEUE, 'priority': PRIORITY_STEPS[step]}
+
+
+def queue_depth(app, queues=INGEST_QUEUES) -> int:
+    """Messages waiting in the broker across queues (reserved ones not included)"""
+    depth = 0
+    with app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for queue in queues:
+            try:
+                depth += channel.queue_declare(queue=queue, passive=True).message_count
+            except connection.channel_errors:
+                # Not declared yet: nothing was ever sent to it
+                channel = connection.channel()
+    return depth
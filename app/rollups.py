@@ -0,0 +1,57 @@
+from sqlalchemy import text
+
+from .models import CityDecadeTemperature, CityTemperature, CityTemperatureStats, YearlyTemperature
+
+SOURCE = CityTemperature.__tablename__
+
+# Slope is the least-squares fit of avg_temperature against year, written
+# with plain aggregates so it runs on PostgreSQL and SQLite alike
+CITY_STATS_SQL = f"""
+INSERT INTO {CityTemperatureStats.__tablename__}
+    (city, first_year, last_year, years, min_temperature, max_temperature, mean_temperature, slope_per_year)
+SELECT
+    city,
+    MIN(year),
+    MAX(year),
+    COUNT(*),
+    MIN(avg_temperature),
+    MAX(avg_temperature),
+    AVG(avg_temperature),
+    CASE WHEN COUNT(*) > 1 THEN
+        (COUNT(*) * SUM(CAST(year AS FLOAT) * avg_temperature) - SUM(CAST(year AS FLOAT)) * SUM(avg_temperature))
+        / NULLIF(COUNT(*) * SUM(CAST(year AS FLOAT) * year) - SUM(CAST(year AS FLOAT)) * SUM(year), 0)
+    END
+FROM {SOURCE}
+GROUP BY city
+"""
+
+DECADE_SQL = f"""
+INSERT INTO {CityDecadeTemperature.__tablename__} (city, decade, avg_temperature, years)
+SELECT city, (year / 10) * 10 AS decade, AVG(avg_temperature), COUNT(*)
+FROM {SOURCE}
+GROUP BY city, (year / 10) * 10
+"""
+
+YEARLY_SQL = f"""
+INSERT INTO {YearlyTemperature.__tablename__} (year, avg_temperature, cities)
+SELECT year, AVG(avg_temperature), COUNT(*)
+FROM {SOURCE}
+GROUP BY year
+"""
+
+ROLLUPS = [
+    (CityTemperatureStats.__tablename__, CITY_STATS_SQL),
+    (CityDecadeTemperature.__tablename__, DECADE_SQL),
+    (YearlyTemperature.__tablename__, YEARLY_SQL),
+]
+
+
+def refresh_rollups(connection) -> None:
+    """Rebuild every rollup table from citytemperature.
+
+    Runs inside the caller's transaction, so readers keep seeing the
+    previous rollups until it commits.
+    """
+    for table, sql in ROLLUPS:
+        connection.execute(text(f"DELETE FROM {table}"))
+        connection.execute(text(sql))
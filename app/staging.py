@@ -0,0 +1,106 @@
+import datetime
+import os
+
+# Columns needed by the ETL; everything else in an upload is skipped
+ETL_COLUMNS = ['dt', 'City', 'AverageTemperature']
+
+# Columnar formats the ETL reads directly, and every accepted upload format
+STAGED_EXTENSIONS = ('.parquet', '.arrow', '.feather')
+UPLOAD_EXTENSIONS = ('.csv',) + STAGED_EXTENSIONS
+
+MISSING_COLUMNS_ERROR = "File must contain 'City', 'dt', and 'AverageTemperature' columns"
+
+
+def _staged_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('dt', pa.string()),
+        ('City', pa.string()),
+        ('AverageTemperature', pa.float64()),
+        ('year', pa.int16()),
+    ])
+
+
+def stage_csv_to_parquet(csv_path: str, block_size: int = 16 * 1024 * 1024) -> str:
+    """Convert a CSV upload once into a typed Parquet file next to it.
+
+    The CSV is streamed block by block with pyarrow's multithreaded reader,
+    keeping only the ETL columns plus a precomputed `year` column so later
+    reads can push the `year > 1900` filter down to row groups. The file is
+    written under a temporary name into a `staged/` subdirectory (which the
+    directory monitor does not scan) and renamed into place. Returns the
+    Parquet path; the CSV is left for the caller to remove.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+    import pyarrow.parquet as pq
+
+    schema = _staged_schema()
+    staged_dir = os.path.join(os.path.dirname(csv_path), 'staged')
+    os.makedirs(staged_dir, exist_ok=True)
+    parquet_path = os.path.join(staged_dir, os.path.splitext(os.path.basename(csv_path))[0] + '.parquet')
+    tmp_path = parquet_path + '.tmp'
+
+    try:
+        reader = pv.open_csv(
+            csv_path,
+            read_options=pv.ReadOptions(block_size=block_size),
+            convert_options=pv.ConvertOptions(
+                include_columns=ETL_COLUMNS,
+                column_types={'dt': pa.string(), 'City': pa.string(), 'AverageTemperature': pa.float64()},
+            ),
+        )
+    except (pa.ArrowInvalid, KeyError):
+        raise ValueError(MISSING_COLUMNS_ERROR)
+
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+            for batch in reader:
+                dt = batch.column('dt')
+                year = pc.cast(pc.utf8_slice_codeunits(dt, 0, 4), pa.int16())
+                writer.write_table(pa.Table.from_arrays(
+                    [dt, batch.column('City'), batch.column('AverageTemperature'), year],
+                    schema=schema,
+                ))
+        os.replace(tmp_path, parquet_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return parquet_path
+
+
+def iter_columnar_chunks(file_path: str, batch_size: int):
+    """Yield DataFrame chunks of the ETL columns from a Parquet or Arrow IPC file.
+
+    Only `dt`, `City` and `AverageTemperature` (and `year` when present) are
+    read, and rows up to 1900 are filtered by the dataset scanner, which
+    skips whole Parquet row groups using their statistics.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    file_format = 'parquet' if file_path.endswith('.parquet') else 'ipc'
+    dataset = ds.dataset(file_path, format=file_format)
+    schema = dataset.schema
+
+    if any(column not in schema.names for column in ETL_COLUMNS):
+        raise ValueError(MISSING_COLUMNS_ERROR)
+
+    columns = list(ETL_COLUMNS)
+    dt_type = schema.field('dt').type
+    if 'year' in schema.names:
+        columns.append('year')
+        row_filter = ds.field('year') > 1900
+    elif pa.types.is_string(dt_type) or pa.types.is_large_string(dt_type):
+        # ISO dates compare lexicographically
+        row_filter = ds.field('dt') >= '1901'
+    elif pa.types.is_date(dt_type) or pa.types.is_timestamp(dt_type):
+        row_filter = ds.field('dt') >= pa.scalar(datetime.date(1901, 1, 1), pa.date32()).cast(dt_type)
+    else:
+        row_filter = None
+
+    for batch in dataset.to_batches(columns=columns, filter=row_filter, batch_size=batch_size):
+        yield batch.to_pandas()
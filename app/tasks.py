@@ -0,0 +1,584 @@
+from celery import chord
+from celery.signals import (
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_ready,
+    worker_shutdown,
+)
+from celery.exceptions import Ignore
+from .config import (
+    DATA_DIR,
+    ETL_CHUNK_SIZE,
+    ETL_ENGINE,
+    ETL_LOAD_BATCH_SIZE,
+    ETL_LOAD_METHOD,
+    ETL_MAX_ATTEMPTS,
+    ETL_PROFILE,
+    ETL_PROFILE_DIR,
+    ETL_PROFILE_TASKS,
+    ETL_PARTITION_MIN_BYTES,
+    ETL_PARTITIONS,
+    ETL_STAGE_PARQUET,
+    ETL_STREAMING,
+    MAINTENANCE_COMPACT_RATIO,
+    MAINTENANCE_MIN_ROWS,
+    STARTUP_SCAN,
+    WATCHER_ENABLED,
+    WATCH_MODE,
+    WATCH_POLL_INTERVAL,
+    WATCH_SETTLE_SECONDS,
+    WORKER_METRICS_PORT,
+)
+import io
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+from .cache import bump_generation
+from .celery_app import celery
+from .db import create_worker_engine
+from .loader import (
+    FILE_DONE,
+    FILE_FAILED,
+    FILE_PROCESSING,
+    begin_attempt,
+    claim_file,
+    file_checksum,
+    get_file_entry,
+    is_path_pending,
+    load_dataframe,
+    lock_loads,
+    set_file_state,
+)
+from .metrics import (
+    ETL_ROWS,
+    ETL_TASK_PEAK_RSS,
+    ETL_TASKS,
+    mark_process_dead,
+    observe_stages,
+    peak_rss_bytes,
+    record_pool,
+    reset_peak_rss,
+    start_worker_exporter,
+)
+from .partitions import TABLE as TEMPERATURE_TABLE, is_partitioned, tables_needing_maintenance
+from .queues import ingest_route
+from .rollups import refresh_rollups
+from .staging import STAGED_EXTENSIONS, UPLOAD_EXTENSIONS, iter_columnar_chunks, stage_csv_to_parquet
+
+# Database setup (the worker's main process uses this one; prefork children build their own)
+engine = create_worker_engine()
+
+# Tasks that do the ETL's heavy lifting; their peak memory is recorded
+ETL_TASK_NAMES = ('process_temperature_data', 'load_partitioned_aggregates', 'aggregate_csv_partition')
+
+
+class _PartitionReader(io.RawIOBase):
+    """Read-only stream over the CSV header followed by one byte range of the file"""
+
+    def __init__(self, file_path: str, start: int, end: int):
+        self._file = open(file_path, 'rb')
+        self._header = self._file.readline()
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._header:
+            size = min(len(buffer), len(self._header))
+            buffer[:size] = self._header[:size]
+            self._header = self._header[size:]
+            return size
+
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._file.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def partition_csv(file_path: str, partitions: int):
+    """Split the CSV body into at most `partitions` (start, end) byte ranges.
+
+    Every boundary is moved forward to the start of the next line, so each
+    range holds whole rows. Assumes no quoted newlines, which holds for the
+    Berkeley Earth files.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        f.readline()  # header
+        data_start = f.tell()
+        step = max((size - data_start) // partitions, 1)
+
+        bounds = [data_start]
+        for i in range(1, partitions):
+            f.seek(max(data_start + i * step, bounds[-1]))
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+        bounds.append(size)
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _fail_file(file_path: str, checksum: Optional[str]) -> None:
+    """Remove a file whose ingest failed and mark it failed in the ledger.
+
+    A file whose load already committed stays done: marking it failed
+    would let claim_file take it again and add its sums a second time.
+    Callers count the failure in ETL_TASKS, once per ingest.
+    """
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    if checksum is None:
+        return
+    try:
+        with engine.begin() as connection:
+            entry = get_file_entry(connection, checksum)
+            if entry is not None and entry.state != FILE_DONE:
+                set_file_state(connection, checksum, FILE_FAILED)
+    except Exception as e:
+        print(f"Error updating file ledger for {file_path}: {str(e)}")
+
+
+def _claim_for_task(file_path: str, checksum: str, task_id: str) -> Optional[str]:
+    """Make sure this task owns the file in the ledger and mark it processing.
+
+    Returns a skip message when the file was already loaded or belongs to
+    another task, None when the task should go ahead. Raises once the task
+    has started ETL_MAX_ATTEMPTS times: an acks_late message whose file
+    kills the worker (e.g. OOM) would otherwise be redelivered forever.
+    """
+    with engine.begin() as connection:
+        entry = get_file_entry(connection, checksum)
+        if entry is None or entry.state == FILE_FAILED:
+            if not claim_file(connection, checksum, file_path, task_id):
+                entry = get_file_entry(connection, checksum)
+
+        if entry is not None and entry.state == FILE_DONE:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return f"Skipped {os.path.basename(file_path)}: already ingested"
+
+        if entry is not None and entry.state != FILE_FAILED and entry.task_id != task_id:
+            # Same contents under another path can go; the owner removes its own file
+            if entry.path != file_path and os.path.exists(file_path):
+                os.remove(file_path)
+            return f"Skipped {os.path.basename(file_path)}: already queued as task {entry.task_id}"
+
+        if entry is not None and entry.state == FILE_PROCESSING and entry.attempts >= ETL_MAX_ATTEMPTS:
+            raise RuntimeError(
+                f"Giving up on {os.path.basename(file_path)}: the worker was lost in all {entry.attempts} attempts"
+            )
+
+        begin_attempt(connection, checksum)
+    return None
+
+
+def _progress_reporter(task):
+    """Callback publishing ETL progress as the task's custom PROGRESS state"""
+    progress = {'stage': 'transform', 'rows_read': 0, 'chunks_done': 0, 'rows_loaded': 0}
+
+    def report(**changes):
+        progress.update(changes)
+        if task.request.id:
+            task.update_state(state='PROGRESS', meta=dict(progress))
+
+    return report
+
+
+def _finish_load(file_path: str, checksum: str, grouped_df, rows_read: int, started: float, report=None,
+                 timings: Optional[dict] = None) -> str:
+    """Load the aggregates, record the file, refresh rollups, invalidate caches and remove the file"""
+    timings = timings if timings is not None else {}
+    if report is not None:
+        report(stage='load', rows_read=rows_read)
+
+    # Load: Upsert into the database, rebuild the statistics rollups from the
+    # merged table and record the file in one transaction, so a failure
+    # leaves neither the sums nor the ledger half updated. Loads take turns,
+    # since each one rebuilds the same rollup tables
+    stage_started = time.perf_counter()
+    with engine.begin() as connection:
+        lock_loads(connection)
+        rows_loaded = load_dataframe(connection, grouped_df, ETL_LOAD_METHOD, ETL_LOAD_BATCH_SIZE)
+        timings['load'] = time.perf_counter() - stage_started
+
+        if report is not None:
+            report(stage='rollups', rows_loaded=rows_loaded)
+        stage_started = time.perf_counter()
+        refresh_rollups(connection)
+        timings['rollups'] = time.perf_counter() - stage_started
+
+        set_file_state(connection, checksum, FILE_DONE, records=len(grouped_df))
+
+    # Invalidate cached API responses now that the load is committed
+    try:
+        bump_generation()
+    except Exception as e:
+        print(f"Error invalidating response cache: {str(e)}")
+    
+    # Clean up uploaded file
+    stage_started = time.perf_counter()
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    timings['cleanup'] = time.perf_counter() - stage_started
+
+    observe_stages(timings)
+    ETL_ROWS.labels('read').inc(rows_read)
+    ETL_ROWS.labels('loaded').inc(rows_loaded)
+    ETL_TASKS.labels('success').inc()
+
+    elapsed = time.time() - started
+    rows_per_sec = rows_read / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {file_path}: {rows_read} rows in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)")
+    
+    return (
+        f"Successfully processed {len(grouped_df)} temperature records "
+        f"({rows_read} rows read, {rows_per_sec:.0f} rows/sec)"
+    )
+
+
+@celery.task(name='process_temperature_data', bind=True)
+def process_temperature_data(self, file_path: str, checksum: Optional[str] = None):
+    """Process temperature CSV data using Pandas and save to database.
+
+    `checksum` is the SHA-256 computed while the file was uploaded, if any.
+    """
+    staged_path = None
+    try:
+        started = time.time()
+
+        # Process each file exactly once: skip loaded files and ones owned by another task
+        if checksum is None:
+            checksum = file_checksum(file_path)
+        skipped = _claim_for_task(file_path, checksum, self.request.id)
+        if skipped:
+            return skipped
+
+        is_csv = not file_path.endswith(STAGED_EXTENSIONS)
+
+        # Fan large files out across workers; the chord's result becomes this task's result
+        if is_csv and ETL_PARTITIONS > 1 and os.path.getsize(file_path) >= ETL_PARTITION_MIN_BYTES:
+            partitions = partition_csv(file_path, ETL_PARTITIONS)
+            body = load_partitioned_aggregates.s(file_path, checksum, started)
+            body.on_error(discard_file.si(file_path, checksum))
+            workflow = chord(
+                [aggregate_csv_partition.s(file_path, start, end) for start, end in partitions],
+                body,
+            )
+            return self.replace(workflow)
+
+        from .transform import aggregate_chunks, aggregate_csv, aggregate_csv_chunked
+
+        report = _progress_reporter(self)
+        timings = {}
+
+        def on_chunk(rows_read, chunks_done):
+            report(rows_read=rows_read, chunks_done=chunks_done)
+
+        # Convert CSV uploads once into typed Parquet; the CSV stays until the
+        # load commits, so a redelivered task can stage it again
+        if is_csv and ETL_STAGE_PARQUET:
+            stage_started = time.perf_counter()
+            staged_path = stage_csv_to_parquet(file_path)
+            timings['stage_parquet'] = time.perf_counter() - stage_started
+
+        # Extract + Transform
+        columnar_path = staged_path or (file_path if not is_csv else None)
+        if columnar_path is not None:
+            grouped_df, rows_read = aggregate_chunks(
+                iter_columnar_chunks(columnar_path, ETL_CHUNK_SIZE), ETL_ENGINE, on_chunk, timings
+            )
+        elif ETL_STREAMING:
+            grouped_df, rows_read = aggregate_csv_chunked(
+                file_path, ETL_CHUNK_SIZE, ETL_ENGINE, on_chunk, timings
+            )
+        else:
+            grouped_df, rows_read = aggregate_csv(file_path, ETL_ENGINE, timings)
+
+        return _finish_load(file_path, checksum, grouped_df, rows_read, started, report, timings)
+
+    except Ignore:
+        # Replaced by the partitioned workflow, which owns the file from now on
+        raise
+    except Exception as e:
+        # Clean up uploaded file even if there's an error
+        ETL_TASKS.labels('failure').inc()
+        _fail_file(file_path, checksum)
+        raise e
+    finally:
+        # The staged copy is only an intermediate of this run
+        if staged_path is not None and os.path.exists(staged_path):
+            os.remove(staged_path)
+
+
+@celery.task(name='aggregate_csv_partition')
+def aggregate_csv_partition(file_path: str, start: int, end: int):
+    """Aggregate one byte range of a CSV into partial (city, year, sum, count) rows"""
+    from .transform import AGGREGATE_COLUMNS, aggregate_csv_chunked
+
+    timings = {}
+    with io.BufferedReader(_PartitionReader(file_path, start, end)) as buffer:
+        grouped_df, rows_read = aggregate_csv_chunked(buffer, ETL_CHUNK_SIZE, ETL_ENGINE, timings=timings)
+    observe_stages(timings)
+
+    return {"rows_read": rows_read, "aggregates": grouped_df[AGGREGATE_COLUMNS].to_dict(orient='list')}
+
+
+@celery.task(name='load_partitioned_aggregates', bind=True)
+def load_partitioned_aggregates(self, partials, file_path: str, checksum: str, started: float):
+    """Chord callback: merge the partial aggregates of every partition and load them once"""
+    import pandas as pd
+
+    from .transform import merge_partials
+
+    try:
+        rows_read = sum(partial["rows_read"] for partial in partials)
+        grouped_df = merge_partials(pd.DataFrame(partial["aggregates"]) for partial in partials)
+
+        report = _progress_reporter(self)
+        report(chunks_done=len(partials))
+        return _finish_load(file_path, checksum, grouped_df, rows_read, started, report)
+
+    except Exception as e:
+        # Counted by the discard_file errback, which runs for this failure too
+        _fail_file(file_path, checksum)
+        raise e
+
+
+@celery.task(name='discard_file')
+def discard_file(file_path: str, checksum: Optional[str] = None):
+    """Remove a file whose partitioned ingest failed (the chord's errback: runs once per ingest)"""
+    ETL_TASKS.labels('failure').inc()
+    _fail_file(file_path, checksum)
+
+
+@celery.task(name='health_check_task')
+def health_check_task():
+    """Simple health check task for Celery"""
+    return "Celery worker is healthy"
+
+
+@celery.task(name='maintain_temperature_tables')
+def maintain_temperature_tables():
+    """VACUUM (ANALYZE) tables changed by at least MAINTENANCE_MIN_ROWS rows since their last analyze.
+
+    Partitions whose dead tuples reach MAINTENANCE_COMPACT_RATIO of their
+    live ones are compacted with VACUUM FULL instead; unpartitioned tables
+    never are, since that would lock out every read. Autovacuum never analyzes
+    a partitioned parent, so its planner statistics are refreshed here too.
+    """
+    if engine.dialect.name != 'postgresql':
+        return "Table maintenance skipped: not PostgreSQL"
+
+    # VACUUM cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        actions = tables_needing_maintenance(connection, MAINTENANCE_MIN_ROWS, MAINTENANCE_COMPACT_RATIO)
+        for table, action in actions:
+            started = time.time()
+            options = "FULL, ANALYZE" if action == 'compact' else "ANALYZE"
+            connection.exec_driver_sql(f"VACUUM ({options}) {table}")
+            print(f"{action} {table} in {time.time() - started:.2f}s")
+
+        if actions and is_partitioned(connection):
+            connection.exec_driver_sql(f"ANALYZE {TEMPERATURE_TABLE}")
+
+    return f"Maintained {len(actions)} tables"
+
+
+def enqueue_data_file(file_path: str) -> Optional[str]:
+    """Queue a fully written data file unless the ledger already knows it.
+
+    Paths already queued or processing are skipped without hashing, so a
+    rescan only pays for new files. Returns the new task id, if any.
+    """
+    with engine.connect() as connection:
+        if is_path_pending(connection, file_path):
+            return None
+
+    checksum = file_checksum(file_path)
+    task_id = str(uuid.uuid4())
+    with engine.begin() as connection:
+        claimed = claim_file(connection, checksum, file_path, task_id)
+        entry = None if claimed else get_file_entry(connection, checksum)
+
+    if not claimed:
+        # Loaded before: the file is a leftover duplicate
+        if entry.state == FILE_DONE and entry.path != file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        return None
+
+    process_temperature_data.apply_async(
+        args=[file_path],
+        kwargs={'checksum': checksum},
+        task_id=task_id,
+        **ingest_route(os.path.getsize(file_path)),
+    )
+    return task_id
+
+
+@celery.task(name='monitor_data_directory')
+def monitor_data_directory():
+    """Scan the data directory once and queue data files the ledger does not know yet"""
+    # Ensure data directory exists
+    os.makedirs(DATA_DIR, exist_ok=True)
+    
+    processed_count = 0
+    
+    # Check for data files in the directory (hidden files are uploads in progress)
+    for filename in os.listdir(DATA_DIR):
+        if filename.endswith(UPLOAD_EXTENSIONS) and not filename.startswith('.'):
+            filepath = os.path.join(DATA_DIR, filename)
+            
+            try:
+                if enqueue_data_file(filepath):
+                    processed_count += 1
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+    
+    return f"Found and queued {processed_count} files for processing"
+
+
+_watcher = None
+
+
+@worker_ready.connect
+def start_data_directory_watcher(sender, **kwargs):
+    """Watch DATA_DIR from the worker's main process and queue new files as they land.
+
+    The watcher's initial scan picks up files that arrived while no worker
+    was running; without it, STARTUP_SCAN queues a one-off directory scan.
+    """
+    global _watcher
+    if not WATCHER_ENABLED:
+        if STARTUP_SCAN:
+            monitor_data_directory.apply_async()
+        return
+
+    from .watcher import DataDirectoryWatcher
+
+    _watcher = DataDirectoryWatcher(
+        DATA_DIR,
+        enqueue_data_file,
+        mode=WATCH_MODE,
+        poll_interval=WATCH_POLL_INTERVAL,
+        settle_seconds=WATCH_SETTLE_SECONDS,
+    )
+    _watcher.start()
+
+
+@worker_shutdown.connect
+def stop_data_directory_watcher(sender, **kwargs):
+    if _watcher is not None:
+        _watcher.stop()
+
+
+@worker_ready.connect
+def start_metrics_exporter(sender, **kwargs):
+    """Expose worker metrics for Prometheus (WORKER_METRICS_PORT=0 disables it)"""
+    if WORKER_METRICS_PORT:
+        start_worker_exporter(WORKER_METRICS_PORT)
+
+
+@worker_init.connect
+def preload_etl_modules(**kwargs):
+    """Import pandas and the transform engines once in the worker's main process.
+
+    Prefork children then inherit them instead of each paying the import on
+    its first task; beat, the API and shell tools never load them.
+    """
+    from . import transform  # noqa: F401
+
+
+@worker_process_init.connect
+def init_worker_engine(**kwargs):
+    """Give each prefork child its own engine and pool.
+
+    Connections pooled before fork() belong to the parent; dispose(close=False)
+    drops them from the child's pool without closing the parent's sockets.
+    """
+    global engine
+    engine.dispose(close=False)
+    engine = create_worker_engine()
+
+
+@worker_process_shutdown.connect
+def cleanup_worker_process(pid=None, **kwargs):
+    """Close the child's pooled connections and retire its metrics files"""
+    engine.dispose()
+    mark_process_dead(pid or os.getpid())
+
+
+# Profilers of the tasks currently running in this process: {task_id: profiler}
+_profilers = {}
+# ETL tasks whose run started from a freshly reset RSS high-water mark
+_rss_tracked = set()
+
+
+@task_prerun.connect
+def reset_task_peak_rss(task_id=None, task=None, **kwargs):
+    """Start each ETL task's peak RSS from its current RSS, not the child's lifetime peak"""
+    if task.name in ETL_TASK_NAMES and reset_peak_rss():
+        _rss_tracked.add(task_id)
+
+
+@task_prerun.connect
+def start_task_profiler(task_id=None, task=None, **kwargs):
+    """Profile the tasks named in ETL_PROFILE_TASKS when ETL_PROFILE is cprofile or pyinstrument"""
+    if not ETL_PROFILE or task.name not in ETL_PROFILE_TASKS:
+        return
+
+    if ETL_PROFILE == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+    else:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    _profilers[task_id] = profiler
+
+
+@task_postrun.connect
+def record_task_metrics(task_id=None, task=None, **kwargs):
+    """Record per-task process metrics and write out the task's profile, if any"""
+    if task.name in ETL_TASK_NAMES:
+        # Without a reset the reading would be an earlier task's peak
+        if task_id in _rss_tracked:
+            _rss_tracked.discard(task_id)
+            ETL_TASK_PEAK_RSS.observe(peak_rss_bytes())
+        record_pool('worker', engine.pool)
+
+    profiler = _profilers.pop(task_id, None)
+    if profiler is None:
+        return
+
+    os.makedirs(ETL_PROFILE_DIR, exist_ok=True)
+    path = os.path.join(ETL_PROFILE_DIR, f"{task.name}-{task_id}")
+    if ETL_PROFILE == 'pyinstrument':
+        profiler.stop()
+        with open(f"{path}.html", "w") as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        profiler.dump_stats(f"{path}.prof")
+    print(f"Wrote {ETL_PROFILE} profile of {task.name} to {path}")
+
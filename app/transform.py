@@ -0,0 +1,222 @@
+"""Transform stage of the ETL: pure functions from raw readings to city-year aggregates.
+
+Every engine takes a DataFrame chunk with the raw `dt`, `City` and
+`AverageTemperature` columns (plus an optional precomputed `year`) and
+returns partial (city, year, temperature_sum, temperature_count) rows.
+Partials are merged with `merge_partials`, so the final mean is exact
+whatever the chunking.
+"""
+import time
+from typing import Optional
+
+import pandas as pd
+
+from .staging import ETL_COLUMNS
+
+# Dtypes of the ETL columns when parsing CSV
+ETL_DTYPES = {'dt': 'string', 'City': 'category', 'AverageTemperature': 'float64'}
+
+AGGREGATE_COLUMNS = ['city', 'year', 'temperature_sum', 'temperature_count']
+OUTPUT_COLUMNS = AGGREGATE_COLUMNS + ['avg_temperature']
+
+MISSING_COLUMNS_ERROR = "CSV must contain 'City', 'dt', and 'AverageTemperature' columns"
+
+# Only records from after this year are kept
+MIN_YEAR = 1900
+
+
+def _year_from_dt(dt: pd.Series) -> pd.Series:
+    """Year of each reading, read straight from the ISO `YYYY-MM-DD` string.
+
+    A plain integer cast of the first four characters is several times
+    faster than pd.to_numeric; chunks with missing or malformed dates fall
+    back to the coercing parse, which turns them into NA. Non-string
+    columns (a date32 `dt` arrives as datetime.date objects) are parsed.
+    """
+    if pd.api.types.is_datetime64_any_dtype(dt):
+        return dt.dt.year
+    if not pd.api.types.is_string_dtype(dt):
+        return pd.to_datetime(dt, errors='coerce').dt.year
+    prefix = dt.str.slice(0, 4)
+    try:
+        return prefix.astype('int64')
+    except (TypeError, ValueError):
+        return pd.to_numeric(prefix, errors='coerce')
+
+
+def partial_aggregate_pandas(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized pandas path: no datetime parsing, categorical cities, unsorted groupby"""
+    temperature = chunk['AverageTemperature']
+    year = chunk['year'] if 'year' in chunk.columns else _year_from_dt(chunk['dt'])
+
+    # Remove rows where temperature is null and keep only records from after 1900
+    mask = (temperature.notna() & (year > MIN_YEAR)).fillna(False).astype(bool)
+
+    city = chunk['City']
+    if not isinstance(city.dtype, pd.CategoricalDtype):
+        city = city.astype('category')
+
+    partial = (
+        temperature[mask]
+        .groupby([city[mask], year[mask].astype('int64')], observed=True, sort=False)
+        .agg(['sum', 'count'])
+    )
+    partial.index.names = ['city', 'year']
+    return partial.reset_index().rename(columns={'sum': 'temperature_sum', 'count': 'temperature_count'})
+
+
+def partial_aggregate_pyarrow(chunk: pd.DataFrame) -> pd.DataFrame:
+    """pyarrow.compute path: filter and hash-aggregate in Arrow memory"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    city = table['City']
+    if pa.types.is_dictionary(city.type):
+        city = pc.cast(city, pa.string())
+
+    if 'year' in table.column_names:
+        year = pc.cast(table['year'], pa.int64())
+    elif pa.types.is_timestamp(table['dt'].type) or pa.types.is_date(table['dt'].type):
+        year = pc.year(table['dt'])
+    else:
+        year = pc.cast(pc.utf8_slice_codeunits(table['dt'], 0, 4), pa.int64())
+
+    temperature = table['AverageTemperature']
+    mask = pc.and_(pc.is_valid(temperature), pc.greater(year, MIN_YEAR))
+    filtered = pa.table({'city': city, 'year': year, 'temperature': temperature}).filter(mask)
+
+    # Aggregated columns come out as temperature_sum / temperature_count
+    partial = filtered.group_by(['city', 'year']).aggregate([('temperature', 'sum'), ('temperature', 'count')])
+    return partial.to_pandas()[AGGREGATE_COLUMNS]
+
+
+def partial_aggregate_polars(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Polars path: lazy filter + group_by on the chunk"""
+    import polars as pl
+
+    frame = pl.from_pandas(chunk)
+    if 'year' in frame.columns:
+        year = pl.col('year').cast(pl.Int64)
+    elif frame.schema['dt'].is_temporal():
+        year = pl.col('dt').dt.year().cast(pl.Int64)
+    else:
+        year = pl.col('dt').str.slice(0, 4).cast(pl.Int64, strict=False)
+
+    partial = (
+        frame.lazy()
+        .select(pl.col('City').cast(pl.Utf8).alias('city'), year.alias('year'), pl.col('AverageTemperature'))
+        .filter(pl.col('AverageTemperature').is_not_null() & (pl.col('year') > MIN_YEAR))
+        .group_by(['city', 'year'])
+        .agg(
+            pl.col('AverageTemperature').sum().alias('temperature_sum'),
+            pl.col('AverageTemperature').count().alias('temperature_count'),
+        )
+        .collect()
+    )
+    return partial.to_pandas()
+
+
+ENGINES = {
+    'pandas': partial_aggregate_pandas,
+    'pyarrow': partial_aggregate_pyarrow,
+    'polars': partial_aggregate_polars,
+}
+
+
+def partial_aggregate(chunk: pd.DataFrame, engine: str = 'pandas') -> pd.DataFrame:
+    """Partial (city, year, temperature_sum, temperature_count) rows of one chunk"""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown transform engine: {engine}")
+    return ENGINES[engine](chunk)
+
+
+def merge_partials(partials) -> pd.DataFrame:
+    """Merge partial aggregates, normalizing city names, and compute the mean.
+
+    City names are stripped here, on the aggregate rather than on every raw
+    row, and rows that collapse onto the same name are summed.
+    """
+    partials = [partial for partial in partials if len(partial)]
+    if not partials:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+    merged = pd.concat(partials, ignore_index=True)
+    merged['city'] = merged['city'].astype(str).str.strip()
+    grouped_df = merged.groupby(['city', 'year'], as_index=False, sort=False)[
+        ['temperature_sum', 'temperature_count']
+    ].sum()
+    grouped_df['avg_temperature'] = grouped_df['temperature_sum'] / grouped_df['temperature_count']
+    return grouped_df
+
+
+def _add_time(timings: dict, stage: str, started: float) -> float:
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - started
+    return now
+
+
+def aggregate_chunks(chunks, engine: str = 'pandas', on_chunk=None, timings: Optional[dict] = None):
+    """Fold DataFrame chunks of the ETL columns into per (city, year) aggregates.
+
+    Partials are merged as they arrive, so memory is bounded by the chunk
+    size plus the number of distinct city-years. on_chunk, if given, is
+    called with (rows_read, chunks_done) after each chunk. Seconds spent
+    reading chunks ('extract'), aggregating them ('transform') and merging
+    partials ('merge') are added to timings when it is given. Returns a
+    tuple (grouped_df, rows_read).
+    """
+    timings = timings if timings is not None else {}
+    totals = None
+    rows_read = 0
+    chunks_done = 0
+    iterator = iter(chunks)
+
+    while True:
+        started = time.perf_counter()
+        chunk = next(iterator, None)
+        started = _add_time(timings, 'extract', started)
+        if chunk is None:
+            break
+
+        rows_read += len(chunk)
+        chunks_done += 1
+        partial = partial_aggregate(chunk, engine)
+        started = _add_time(timings, 'transform', started)
+
+        merged = merge_partials([totals, partial] if totals is not None else [partial])
+        totals = merged[AGGREGATE_COLUMNS]
+        _add_time(timings, 'merge', started)
+
+        if on_chunk is not None:
+            on_chunk(rows_read, chunks_done)
+
+    return merge_partials([totals] if totals is not None else []), rows_read
+
+
+def aggregate_csv(file_path: str, engine: str = 'pandas', timings: Optional[dict] = None):
+    """Load the whole CSV and compute the temperature sum, count and average per city and year.
+
+    Returns a tuple (grouped_df, rows_read).
+    """
+    df = pd.read_csv(file_path, dtype=ETL_DTYPES)
+    if any(column not in df.columns for column in ETL_COLUMNS):
+        raise ValueError(MISSING_COLUMNS_ERROR)
+    return aggregate_chunks([df[ETL_COLUMNS]], engine, timings=timings)
+
+
+def aggregate_csv_chunked(source, chunk_size: int, engine: str = 'pandas', on_chunk=None,
+                          timings: Optional[dict] = None):
+    """Stream the CSV in chunks and compute the temperature sum, count and average per city and year.
+
+    Only the ETL columns are parsed, with explicit dtypes and a categorical
+    City. `source` is a file path or a binary buffer. Returns a tuple
+    (grouped_df, rows_read).
+    """
+    try:
+        reader = pd.read_csv(source, usecols=ETL_COLUMNS, dtype=ETL_DTYPES, chunksize=chunk_size)
+    except ValueError:
+        raise ValueError(MISSING_COLUMNS_ERROR)
+
+    with reader:
+        return aggregate_chunks(reader, engine, on_chunk, timings)
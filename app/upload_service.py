@@ -1,5 +1,8 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import aiohttp
+import asyncio
 import os
 from datetime import datetime
 import uvicorn
@@ -7,7 +10,19 @@ import uvicorn
 # Usar importación absoluta en lugar de relativa
 import sys
 sys.path.append('/app')
-from app.config import DATA_DIR
+from app.config import (
+    API_BASE_URL,
+    DATA_DIR,
+    INGEST_RETRY_AFTER,
+    UPLOAD_CHUNK_SIZE,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_KEEPALIVE_TIMEOUT,
+    UPSTREAM_POOL_LIMIT,
+    UPSTREAM_RETRIES,
+    UPSTREAM_RETRY_BACKOFF,
+    UPSTREAM_TIMEOUT,
+)
+from app.staging import UPLOAD_EXTENSIONS
 
 app = FastAPI(title="Temperature CSV Upload Service")
 
@@ -15,6 +30,46 @@ app = FastAPI(title="Temperature CSV Upload Service")
 UPLOAD_DIR = DATA_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Cliente HTTP compartido hacia la API principal (keep-alive, pool de conexiones)
+http_client = None
+
+
+@app.on_event("startup")
+async def startup_event():
+    global http_client
+    http_client = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=UPSTREAM_POOL_LIMIT, keepalive_timeout=UPSTREAM_KEEPALIVE_TIMEOUT),
+        timeout=aiohttp.ClientTimeout(total=UPSTREAM_TIMEOUT, sock_connect=UPSTREAM_CONNECT_TIMEOUT),
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await http_client.close()
+
+
+async def call_api(method: str, path: str, make_data=None, **kwargs):
+    """Llamar a la API principal con el cliente compartido.
+
+    Reintenta con backoff exponencial ante errores 5xx o de conexión.
+    make_data construye el cuerpo de nuevo en cada intento. Devuelve
+    (status, cuerpo JSON si status es 200, si no el texto del error).
+    """
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        last_attempt = attempt == UPSTREAM_RETRIES
+        if make_data is not None:
+            kwargs['data'] = make_data()
+        try:
+            async with http_client.request(method, f'{API_BASE_URL}{path}', **kwargs) as response:
+                if response.status == 200:
+                    return response.status, await response.json()
+                if response.status < 500 or last_attempt:
+                    return response.status, await response.text()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if last_attempt:
+                raise
+        await asyncio.sleep(UPSTREAM_RETRY_BACKOFF * 2 ** attempt)
+
 
 @app.get("/", response_class=HTMLResponse)
 async def home():
@@ -42,7 +97,7 @@ async def home():
         
         <div class="upload-area">
             <form id="uploadForm" enctype="multipart/form-data">
-                <input type="file" id="fileInput" name="file" accept=".csv" required>
+                <input type="file" id="fileInput" name="file" accept=".csv,.parquet,.arrow,.feather" required>
                 <br><br>
                 <button type="submit">Upload CSV</button>
             </form>
@@ -51,6 +106,38 @@ async def home():
         <div id="result"></div>
         
         <script>
+            // Muestra el estado (y el progreso) de una tarea ETL
+            function renderStatus(taskId, data) {
+                const statusDiv = document.getElementById(`status-${taskId}`);
+                let statusHtml = `<div style="margin-top: 10px; padding: 10px; border: 1px solid #ddd; border-radius: 4px;">
+                    <strong>Status:</strong> ${data.status}<br>`;
+                
+                if (data.progress) {
+                    statusHtml += `<strong>Stage:</strong> ${data.progress.stage}<br>
+                        <strong>Rows read:</strong> ${data.progress.rows_read}<br>
+                        <strong>Chunks done:</strong> ${data.progress.chunks_done}<br>
+                        <strong>Rows loaded:</strong> ${data.progress.rows_loaded}<br>`;
+                }
+                if (data.result) {
+                    statusHtml += `<strong>Result:</strong> ${data.result}<br>`;
+                }
+                if (data.error) {
+                    statusHtml += `<strong>Error:</strong> ${data.error}<br>`;
+                }
+                
+                statusHtml += `<p><small>Last update: ${new Date().toLocaleTimeString()}</small></p></div>`;
+                statusDiv.innerHTML = statusHtml;
+            }
+            
+            // Recibe las actualizaciones del servidor (SSE) en lugar de consultar a mano
+            function watchStatus(taskId) {
+                const source = new EventSource(`/etl/status/stream?task_ids=${taskId}`);
+                source.addEventListener('status', (event) => renderStatus(taskId, JSON.parse(event.data)));
+                source.addEventListener('done', () => source.close());
+                source.addEventListener('timeout', () => source.close());
+                source.onerror = () => source.close();
+            }
+            
             // Función para verificar el estado de la tarea ETL
             async function checkStatus(taskId) {
                 const statusDiv = document.getElementById(`status-${taskId}`);
@@ -122,6 +209,7 @@ async def home():
                                 <div id="status-${data.task_id}"></div>
                             </div>
                         `;
+                        watchStatus(data.task_id);
                     } else {
                         resultDiv.innerHTML = `<div class="result error">❌ Error: ${data.detail}</div>`;
                     }
@@ -137,48 +225,55 @@ async def home():
 
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
-    """Endpoint para subir archivos CSV"""
+    """Endpoint para subir archivos CSV (o Parquet/Arrow)"""
     
-    # Validar que sea un archivo CSV
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    # Validar que sea un archivo soportado
+    if not file.filename.endswith(UPLOAD_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Only CSV, Parquet or Arrow files are allowed")
     
     try:
-        # Preparar para enviar el archivo a la API principal
-        import aiohttp
-        from io import BytesIO
+        # Tamaño del archivo sin leerlo en memoria (Starlette ya lo guardó en disco)
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
         
-        # Leer el contenido del archivo
-        content = await file.read()
-        file_size = len(content)
+        # Crear un objeto FormData que envía el archivo por partes (streaming);
+        # se rehace en cada intento. aiohttp cierra los objetos de archivo que
+        # envía, así que se le pasa un generador y el archivo queda abierto
+        # para volver a leerlo desde el inicio en el siguiente intento
+        async def read_chunks():
+            await run_in_threadpool(file.file.seek, 0)
+            while chunk := await run_in_threadpool(file.file.read, UPLOAD_CHUNK_SIZE):
+                yield chunk
         
-        # Crear un objeto FormData para enviar el archivo
-        data = aiohttp.FormData()
-        data.add_field('file',
-                      BytesIO(content),
-                      filename=file.filename,
-                      content_type='text/csv')
-        
-        # Enviar el archivo a la API principal
-        async with aiohttp.ClientSession() as session:
-            async with session.post('http://fastapi_app:8000/datasets', data=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    
-                    # Devolver respuesta con información del proceso ETL
-                    return {
-                        "message": "File uploaded successfully and ETL process started",
-                        "filename": file.filename,
-                        "size": file_size,
-                        "etl_status": result["status"],
-                        "task_id": result["task_id"],
-                        "status_url": f"/etl/status/{result['task_id']}"
-                    }
-                else:
-                    error_text = await response.text()
-                    raise HTTPException(status_code=response.status, detail=f"API Error: {error_text}")
+        def make_form():
+            data = aiohttp.FormData()
+            data.add_field('file',
+                          read_chunks(),
+                          filename=file.filename,
+                          content_type=file.content_type or 'application/octet-stream')
+            return data
         
+        # Enviar el archivo a la API principal (la API descarta los duplicados si un reintento llega dos veces)
+        status, result = await call_api('POST', '/datasets', make_data=make_form)
+        if status == 429:
+            # La API tiene demasiadas cargas en cola: el cliente debe reintentar más tarde
+            raise HTTPException(status_code=429, detail=f"API Error: {result}",
+                                headers={"Retry-After": str(INGEST_RETRY_AFTER)})
+        if status != 200:
+            raise HTTPException(status_code=status, detail=f"API Error: {result}")
         
+        # Devolver respuesta con información del proceso ETL
+        return {
+            "message": "File uploaded successfully and ETL process started",
+            "filename": file.filename,
+            "size": file_size,
+            "etl_status": result["status"],
+            "task_id": result["task_id"],
+            "status_url": f"/etl/status/{result['task_id']}"
+        }
+    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
 
@@ -189,7 +284,7 @@ async def list_files():
     try:
         files = []
         for filename in os.listdir(UPLOAD_DIR):
-            if filename.endswith('.csv'):
+            if filename.endswith(UPLOAD_EXTENSIONS):
                 filepath = os.path.join(UPLOAD_DIR, filename)
                 file_size = os.path.getsize(filepath)
                 files.append({
@@ -203,22 +298,46 @@ async def list_files():
         raise HTTPException(status_code=500, detail=f"Error listing files: {str(e)}")
 
 
+@app.get("/etl/status/stream")
+async def stream_etl_status(task_ids: str):
+    """Reenviar el stream SSE de estado/progreso de la API principal"""
+    try:
+        # Sin límite total: el stream dura lo que dure el ETL
+        response = await http_client.get(
+            f'{API_BASE_URL}/etl/status/stream',
+            params={'task_ids': task_ids},
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=UPSTREAM_CONNECT_TIMEOUT),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error checking task status: {str(e)}")
+    
+    if response.status != 200:
+        error_text = await response.text()
+        response.release()
+        raise HTTPException(status_code=response.status, detail=f"API Error: {error_text}")
+    
+    async def events():
+        try:
+            async for chunk in response.content.iter_any():
+                yield chunk
+        finally:
+            response.release()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @app.get("/etl/status/{task_id}")
 async def check_etl_status(task_id: str):
     """Verificar el estado de una tarea ETL"""
     try:
-        import aiohttp
-        
         # Consultar el estado de la tarea en la API principal
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f'http://fastapi_app:8000/etl/status/{task_id}') as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return result
-                else:
-                    error_text = await response.text()
-                    raise HTTPException(status_code=response.status, detail=f"API Error: {error_text}")
+        status, result = await call_api('GET', f'/etl/status/{task_id}')
+        if status != 200:
+            raise HTTPException(status_code=status, detail=f"API Error: {result}")
+        return result
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking task status: {str(e)}")
 
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers.polling import PollingObserver
+
+from .staging import UPLOAD_EXTENSIONS
+
+
+def _is_data_file(path: str) -> bool:
+    """Data files only; hidden names are uploads still being written"""
+    name = os.path.basename(path)
+    return name.endswith(UPLOAD_EXTENSIONS) and not name.startswith('.')
+
+
+class _PendingFilesHandler(FileSystemEventHandler):
+    """Record paths touched by filesystem events for the watcher loop"""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.track(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.track(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.track(event.dest_path, complete=True)
+
+    def on_closed(self, event):
+        # inotify IN_CLOSE_WRITE: the writer is done with the file
+        if not event.is_directory:
+            self.watcher.track(event.src_path, complete=True)
+
+
+class DataDirectoryWatcher:
+    """Call on_file once for each data file that is fully written to a directory.
+
+    Uses inotify when available (mode "auto" or "inotify") and a polling
+    observer otherwise. A file is handed over after a close-write or rename
+    event, or once its size and mtime have been stable for settle_seconds
+    (the only signal the polling observer has). Files already present when
+    the watcher starts are picked up by a single initial scan.
+    """
+
+    def __init__(self, directory: str, on_file, mode: str = "auto", poll_interval: float = 5.0,
+                 settle_seconds: float = 2.0):
+        self.directory = directory
+        self.on_file = on_file
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        # path -> (size, mtime, last change time, complete)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def _create_observer(self):
+        if self.mode in ("auto", "inotify"):
+            try:
+                from watchdog.observers.inotify import InotifyObserver
+
+                return InotifyObserver()
+            except Exception as e:
+                if self.mode == "inotify":
+                    raise
+                print(f"inotify unavailable, polling {self.directory}: {str(e)}")
+        return PollingObserver(timeout=self.poll_interval)
+
+    def track(self, path: str, complete: bool = False) -> None:
+        if not _is_data_file(path):
+            return
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            previous = self._pending.get(path)
+            changed = previous is None or previous[:2] != (stat.st_size, stat.st_mtime)
+            last_change = time.monotonic() if changed else previous[2]
+            self._pending[path] = (stat.st_size, stat.st_mtime, last_change, complete)
+
+    def _ready_paths(self):
+        """Pop the pending paths that are complete or have settled"""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, (size, mtime, last_change, complete) in list(self._pending.items()):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    del self._pending[path]
+                    continue
+                if (stat.st_size, stat.st_mtime) != (size, mtime):
+                    self._pending[path] = (stat.st_size, stat.st_mtime, now, False)
+                elif complete or now - last_change >= self.settle_seconds:
+                    del self._pending[path]
+                    ready.append(path)
+        return ready
+
+    def _run(self):
+        while not self._stop.wait(0.5):
+            for path in self._ready_paths():
+                try:
+                    self.on_file(path)
+                except Exception as e:
+                    print(f"Error queueing {path}: {str(e)}")
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._observer = self._create_observer()
+        self._observer.schedule(_PendingFilesHandler(self), self.directory, recursive=False)
+        self._observer.start()
+
+        for filename in os.listdir(self.directory):
+            self.track(os.path.join(self.directory, filename))
+
+        self._thread = threading.Thread(target=self._run, name="data-directory-watcher", daemon=True)
+        self._thread.start()
+        print(f"Watching {self.directory} with {type(self._observer).__name__}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,66 @@
+"""Measure concurrent GET throughput and latency against a running service.
+
+Run it once per build to compare (e.g. before and after a change):
+    python -m benchmarks.bench_api_concurrency --url http://localhost:8000 \
+        --concurrency 50 --requests 2000
+
+Proxied status checks through the upload service:
+    python -m benchmarks.bench_api_concurrency --url http://localhost:8001 \
+        --path /etl/status/<task_id> --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+
+async def worker(session, url, params, queue, latencies):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        started = time.perf_counter()
+        async with session.get(url, params=params) as response:
+            await response.read()
+            response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(args):
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+
+    params = {k: v for k, v in (("city", args.city), ("year", args.year)) if v is not None}
+    latencies = []
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(session, f"{args.url}{args.path}", params, queue, latencies)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{len(latencies)} requests, concurrency {args.concurrency}: {len(latencies) / elapsed:.1f} req/s")
+    print(f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--path', default='/temperatures')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--city')
+    parser.add_argument('--year', type=int)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compare parsing the ETL columns from CSV against the staged Parquet file.
+
+Usage:
+    python -m benchmarks.bench_staging --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from app.staging import ETL_COLUMNS, iter_columnar_chunks, stage_csv_to_parquet
+from benchmarks.synthetic import MONTHS_PER_CITY, write_temperature_csv
+
+CSV_DTYPES = {'dt': 'string', 'City': 'category', 'AverageTemperature': 'float64'}
+
+
+def timed(label, func, rows):
+    """Run func, which returns the rows it kept; rows/sec is over the rows it scanned"""
+    started = time.perf_counter()
+    kept = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:>24}: {elapsed:7.2f}s ({rows / elapsed:,.0f} rows/sec, {kept:,} rows kept)")
+    return elapsed, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=500000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Give each city the full date range, so the >1900 filter keeps the real file's share of rows
+        cities = max(1, min(3500, args.rows // MONTHS_PER_CITY))
+        csv_path = write_temperature_csv(os.path.join(tmp, 'temperatures.csv'), args.rows, cities=cities)
+
+        def parse_csv():
+            # Same rows as the Parquet read: the scanner's year > 1900 filter, applied after parsing
+            with pd.read_csv(csv_path, usecols=ETL_COLUMNS, dtype=CSV_DTYPES, chunksize=args.chunk_size) as reader:
+                return sum(int((chunk['dt'] >= '1901').sum()) for chunk in reader)
+
+        staged = {}
+
+        def stage():
+            staged['path'] = stage_csv_to_parquet(csv_path)
+            return args.rows
+
+        def parse_parquet():
+            return sum(len(chunk) for chunk in iter_columnar_chunks(staged['path'], args.chunk_size))
+
+        csv_time, csv_rows = timed("CSV parse (>1900)", parse_csv, args.rows)
+        timed("CSV -> Parquet staging", stage, args.rows)
+        parquet_time, parquet_rows = timed("Parquet read (>1900)", parse_parquet, args.rows)
+        if csv_rows != parquet_rows:
+            raise SystemExit(f"CSV kept {csv_rows} rows but Parquet {parquet_rows}; the comparison is off")
+
+        csv_size = os.path.getsize(csv_path)
+        parquet_size = os.path.getsize(staged['path'])
+        print(f"parse speedup: {csv_time / parquet_time:.1f}x")
+        print(f"disk size: CSV {csv_size / 1e6:.1f} MB, Parquet {parquet_size / 1e6:.1f} MB "
+              f"({parquet_size / csv_size:.0%} of CSV)")
+
+
+if __name__ == '__main__':
+    main()
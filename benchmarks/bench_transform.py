@@ -0,0 +1,66 @@
+"""Throughput of the transform engines against the original whole-frame transform.
+
+Usage:
+    python -m benchmarks.bench_transform --rows 1000000 10000000 \
+        --engines baseline pandas pyarrow polars --min-rows-per-sec 2000000
+
+Exits non-zero when any engine other than the baseline falls below
+--min-rows-per-sec, so it can guard throughput in CI.
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from app.staging import ETL_COLUMNS
+from app.transform import ETL_DTYPES, aggregate_chunks
+from benchmarks.synthetic import MONTHS_PER_CITY, temperature_frame
+
+
+def baseline_transform(df: pd.DataFrame) -> pd.DataFrame:
+    """The transform as originally written in process_temperature_data"""
+    df = df.dropna(subset=['AverageTemperature'])
+    df['year'] = pd.to_datetime(df['dt']).dt.year
+    df = df[df['year'] > 1900]
+    df['City'] = df['City'].str.strip()
+    return df.groupby(['City', 'year'])['AverageTemperature'].mean().reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--engines', nargs='+', default=['baseline', 'pandas', 'pyarrow', 'polars'])
+    parser.add_argument('--chunk-size', type=int, default=500000)
+    parser.add_argument('--min-rows-per-sec', type=float, default=0)
+    args = parser.parse_args()
+
+    failures = 0
+    for rows in args.rows:
+        # Give each city the full date range, so the year > 1900 filter keeps the real file's share of rows
+        cities = max(1, min(3500, rows // MONTHS_PER_CITY))
+        raw = temperature_frame(0, rows, rows, cities)[ETL_COLUMNS].astype(ETL_DTYPES)
+        chunks = [raw.iloc[start:start + args.chunk_size] for start in range(0, rows, args.chunk_size)]
+
+        for engine in args.engines:
+            try:
+                started = time.perf_counter()
+                if engine == 'baseline':
+                    baseline_transform(raw.astype({'dt': object, 'City': object}))
+                else:
+                    aggregate_chunks(chunks, engine)
+                elapsed = time.perf_counter() - started
+            except ImportError as e:
+                print(f"{rows:>10,} rows {engine:>8}: skipped ({e})")
+                continue
+
+            rate = rows / elapsed
+            slow = engine != 'baseline' and rate < args.min_rows_per_sec
+            failures += slow
+            print(f"{rows:>10,} rows {engine:>8}: {elapsed:6.2f}s {rate:>12,.0f} rows/sec{'  TOO SLOW' if slow else ''}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Synthetic Berkeley-Earth-shaped temperature data for benchmarks."""
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    'dt', 'AverageTemperature', 'AverageTemperatureUncertainty',
+    'City', 'Country', 'Latitude', 'Longitude',
+]
+
+# Monthly readings from 1743 to 2013, as in GlobalLandTemperaturesByCity.csv;
+# datasets with fewer than this many rows per city never reach 1900
+MONTHS_PER_CITY = (2013 - 1743 + 1) * 12
+
+
+def temperature_frame(start: int, size: int, rows: int, cities: int = 3500, seed: int = 0) -> pd.DataFrame:
+    """Rows [start, start + size) of a `rows`-row synthetic dataset.
+
+    Mirrors GlobalLandTemperaturesByCity.csv: monthly readings from 1743 on,
+    ISO dates, ~4% missing temperatures and a few city names with stray
+    whitespace.
+    """
+    rng = np.random.default_rng(seed + start)
+    city_names = np.array([f"City {i}" if i % 50 else f" City {i} " for i in range(cities)])
+    months_per_city = max(rows // cities, 1)
+
+    index = np.arange(start, start + size)
+    city = index // months_per_city % cities
+    month = index % months_per_city
+    years = 1743 + month // 12
+    temperature = rng.normal(15, 8, size).round(3)
+    temperature[rng.random(size) < 0.04] = np.nan
+
+    return pd.DataFrame({
+        'dt': [f"{y:04d}-{m:02d}-01" for y, m in zip(years, month % 12 + 1)],
+        'AverageTemperature': temperature,
+        'AverageTemperatureUncertainty': rng.uniform(0.1, 3, size).round(3),
+        'City': city_names[city],
+        'Country': 'Country',
+        'Latitude': '57.05N',
+        'Longitude': '10.33E',
+    }, columns=COLUMNS)
+
+
+def write_temperature_csv(path: str, rows: int, cities: int = 3500, chunk_size: int = 1000000, seed: int = 0) -> str:
+    """Write a `rows`-row synthetic dataset to path as CSV, chunk by chunk"""
+    written = 0
+    with open(path, 'w') as f:
+        while written < rows:
+            size = min(chunk_size, rows - written)
+            frame = temperature_frame(written, size, rows, cities, seed)
+            frame.to_csv(f, index=False, header=written == 0)
+            written += size
+
+    return path